@@ -0,0 +1,205 @@
+"""Offline pipeline benchmark with a fake LLM.
+
+Generates synthetic datasets and measures wall time, peak Python memory (tracemalloc),
+LLM calls, tool calls and tokens of `load_file_context`, the data-clean tools,
+`data_clean_agent`, `index_agent` and a full `create_graph()` run. The models are replaced
+by the scripted FakeChatModel, so no OpenAI or Ollama endpoint is needed.
+
+    python benchmarks/bench_pipeline.py --scale small --latency 0.2 --output bench.json
+    python benchmarks/bench_pipeline.py --scale small --latency 0.2 --baseline bench.json
+
+With --baseline the exit code is 1 if a stage got slower than the tolerance allows or
+made a different number of LLM/tool calls.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_PATH, os.pardir, "src"))
+
+import agents
+import synthetic_data
+from fake_llm import FakeChatModel, plan_from_profile
+from llm_usage import llm_usage
+
+
+class Benchmark:
+    """Runs stages and collects their measurements.
+
+    LLM calls are counted over all fake models, tool calls only over the cleaning agent's
+    model (the indexing model answers through a FileContext tool call on every call).
+    """
+
+    def __init__(self, fakes: list[FakeChatModel], agent_fake: FakeChatModel, trace_memory: bool = True):
+        self.fakes = fakes
+        self.agent_fake = agent_fake
+        self.trace_memory = trace_memory
+        self.results: dict[str, dict] = {}
+
+    def measure(self, name: str, fn) -> None:
+        for fake in self.fakes:
+            fake.reset_stats()
+        llm_usage.reset()
+        if self.trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        error = None
+        try:
+            fn()
+        except Exception as e:
+            error = str(e)
+        wall = time.perf_counter() - start
+
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / 1024**2
+            tracemalloc.stop()
+
+        usage = llm_usage.snapshot()
+        self.results[name] = {
+            "wall_s": wall,
+            "peak_mb": peak,
+            "llm_calls": sum(fake.stats["calls"] for fake in self.fakes),
+            "tool_calls": self.agent_fake.stats["tool_calls"],
+            "tokens": usage["total_tokens"],
+            "error": error
+        }
+        peak_text = f"{peak:8.1f} MB" if peak is not None else "       - MB"
+        print(f"{name:<40} {wall:8.3f} s {peak_text} {self.results[name]['llm_calls']:4d} LLM {self.results[name]['tool_calls']:4d} tools" + (f"  ERROR {error}" if error else ""))
+
+
+def make_run(workdir: str, name: str, files: list[str]) -> dict:
+    """Fresh run directory with the files linked into its data directory, and empty caches"""
+    from state import AgentState
+    shutil.rmtree(os.path.join(workdir, "cache"), ignore_errors=True)
+    memory_path = os.path.join(workdir, "runs", name)
+    shutil.rmtree(memory_path, ignore_errors=True)
+    os.makedirs(os.path.join(memory_path, "data"))
+    os.makedirs(os.path.join(memory_path, "output"))
+    for file in files:
+        target = os.path.join(memory_path, "data", os.path.basename(file))
+        try:
+            os.link(file, target)
+        except OSError:
+            shutil.copy2(file, target)
+    return AgentState(uuid=f"bench-{name}", messages=[], debug=False, memory_path=memory_path)
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_seconds: float) -> list[str]:
+    """Regressions of the results against a baseline result file"""
+    regressions = []
+    for name, result in results["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None:
+            continue
+        if result["wall_s"] > base["wall_s"] * (1 + tolerance) and result["wall_s"] - base["wall_s"] > min_seconds:
+            regressions.append(f"{name}: {base['wall_s']:.3f} s -> {result['wall_s']:.3f} s")
+        for key in ["llm_calls", "tool_calls"]:
+            if result[key] != base[key]:
+                regressions.append(f"{name}: {key} {base[key]} -> {result[key]}")
+        if result["error"] and not base["error"]:
+            regressions.append(f"{name}: failed with {result['error']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=list(synthetic_data.SCALES), default="small")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per fake LLM call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="Directory for the datasets, runs and caches (temporary by default)")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip peak memory tracking, it slows pandas down")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=None, help="Compare against an earlier results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown against the baseline")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench_"))
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)  # The plan and index caches are relative to the working directory
+
+    # Replace the models before anything builds them
+    from agents import FileContext
+    clean_llm = FakeChatModel(latency=args.latency, callbacks=[llm_usage])
+    index_llm = FakeChatModel(latency=args.latency, callbacks=[llm_usage])
+    agents.get_data_cleaning_llm.override(clean_llm)
+    agents.get_indexing_llm.override(index_llm.with_structured_output(FileContext))
+    agents.get_local_llm.override(clean_llm)
+    agents.get_local_indexing_llm.override(index_llm.with_structured_output(FileContext))
+    agents.get_hosted_indexing_llm.override(index_llm.with_structured_output(FileContext))
+
+    from utils import load_file_context
+    from data_clean_agent_tools import DataFrameContext, load_tabular_data, profile_dataframe, apply_cleaning_plan
+    from data_clean_agent import data_clean_agent
+    from index_agent import index_agent
+    import graph
+
+    print(f"Generating {args.scale} datasets in {workdir}")
+    paths = synthetic_data.generate(os.path.join(workdir, "datasets"), args.scale, args.seed)
+    tabular = [paths["tall_csv"], paths["wide_csv"], paths["multi_sheet_xlsx"]]
+
+    bench = Benchmark([clean_llm, index_llm], clean_llm, trace_memory=not args.no_tracemalloc)
+
+    for name, path in paths.items():
+        bench.measure(f"load_file_context:{name}", lambda: load_file_context(path, max_chars=2000))
+
+    tools = {}
+    bench.measure("tools:load_tabular_data", lambda: tools.update(df=load_tabular_data(paths["tall_csv"])))
+    bench.measure("tools:profile_dataframe", lambda: tools.update(profile=profile_dataframe(tools["df"])))
+
+    def apply_plan():
+        config = {"configurable": {"dataframe_context": DataFrameContext(tools["df"])}}
+        apply_cleaning_plan.invoke({"operations": plan_from_profile(tools["profile"])}, config=config)
+    bench.measure("tools:apply_cleaning_plan", apply_plan)
+    tools.clear()
+
+    state = make_run(workdir, "clean", tabular)
+    bench.measure("data_clean_agent", lambda: data_clean_agent(state))
+
+    state = make_run(workdir, "index", list(paths.values()))
+    bench.measure("index_agent", lambda: index_agent(state))
+
+    state = make_run(workdir, "graph", list(paths.values()))
+    bench.measure("graph", lambda: graph.run_graph(graph.create_graph(), state))
+
+    results = {
+        "meta": {
+            "scale": args.scale,
+            "latency_s": args.latency,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": datetime.now().isoformat()
+        },
+        "stages": bench.results
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.workdir is None:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if baseline:
+        with open(baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_seconds)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
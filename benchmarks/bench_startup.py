@@ -0,0 +1,89 @@
+"""Import-time and startup benchmark.
+
+Measures the cold import time of the app modules in fresh interpreters and the time to
+build each registry entry (models, cleaning agent, compiled graph) on first use versus
+the cached lookup afterwards. No model endpoint is called, only the clients are built.
+
+    python benchmarks/bench_startup.py --repeat 5 --output bench_startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+MODULES = ["agents", "state", "utils", "data_clean_agent_tools", "index_agent", "data_clean_agent", "graph"]
+
+
+def import_time(module: str, repeat: int) -> dict:
+    """Wall time of importing a module in a fresh interpreter, in seconds"""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=SRC_PATH,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        times.append(float(output.stdout.strip().splitlines()[-1]))
+    return {"median_s": statistics.median(times), "min_s": min(times), "max_s": max(times)}
+
+
+def first_use_time(get) -> dict:
+    """Time of the first (building) and second (cached) call of a registry entry, in seconds"""
+    start = time.perf_counter()
+    try:
+        get()
+    except Exception as e:
+        return {"error": str(e)}
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    get()
+    return {"first_s": first, "cached_s": time.perf_counter() - start}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # Clients only need a key to be constructed
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+    results = {"import": {}, "first_use": {}}
+    for module in MODULES:
+        results["import"][module] = import_time(module, args.repeat)
+        print(f"import {module:<24} {results['import'][module]['median_s'] * 1000:8.1f} ms")
+
+    sys.path.insert(0, SRC_PATH)
+    import agents
+    import graph
+    for name, get in [
+        ("ui_llm", agents.get_ui_llm),
+        ("data_cleaning_llm", agents.get_data_cleaning_llm),
+        ("agent_data_clean", agents.get_agent_data_clean),
+        ("indexing_llm", agents.get_indexing_llm),
+        ("local_agent_data_clean", agents.get_local_agent_data_clean),
+        ("hosted_indexing_llm", agents.get_hosted_indexing_llm),
+        ("compiled_graph", graph.get_graph)
+    ]:
+        results["first_use"][name] = first_use_time(get)
+        timing = results["first_use"][name]
+        if "error" in timing:
+            print(f"build  {name:<24} error: {timing['error']}")
+        else:
+            print(f"build  {name:<24} {timing['first_s'] * 1000:8.1f} ms (cached {timing['cached_s'] * 1e6:.1f} us)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Deterministic stand-in for the chat models, so the pipeline can be benchmarked offline.
+
+The cleaning agent gets a scripted ReAct run: an optional inspection tool call, one
+`apply_cleaning_plan` call derived from the column profile in the first message, and a
+final answer. Structured output requests (the indexing LLM) get a `FileContext` tool call
+built from the file name and content in the prompt. Every call sleeps `latency` seconds.
+"""
+import re
+import json
+import time
+import threading
+from typing import Any, List, Optional
+from pydantic import Field
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+_stats_lock = threading.Lock()
+
+
+def snake_case(name: str) -> str:
+    return re.sub(r"[^0-9a-zA-Z]+", "_", str(name)).strip("_").lower() or "column"
+
+
+def plan_from_profile(profile: dict) -> List[dict]:
+    """Cleaning operations a reasonable agent would pick from a profile_dataframe result"""
+    columns = profile.get("columns", {})
+    names = {column: snake_case(column) for column in columns}
+    operations = []
+
+    mapping = {old: new for old, new in names.items() if old != new and list(names.values()).count(new) == 1}
+    if mapping:
+        operations.append({"operation": "rename_columns", "column_mapping": mapping})
+    names = {column: mapping.get(column, column) for column in columns}
+
+    empty = [names[column] for column, info in columns.items() if info["nulls"] == profile["shape"]["rows"]]
+    if empty:
+        operations.append({"operation": "drop_columns", "columns": empty})
+    if profile.get("duplicate_rows", 0) > 0:
+        operations.append({"operation": "remove_duplicates"})
+
+    for column, info in columns.items():
+        if names[column] in empty:
+            continue
+        semantic_type = info.get("semantic_type", "")
+        if semantic_type == "numeric (stored as text)":
+            operations.append({"operation": "convert_column_type", "column": names[column], "target_type": "numeric"})
+        elif semantic_type == "datetime (stored as text)":
+            operations.append({"operation": "convert_column_type", "column": names[column], "target_type": "datetime"})
+        if info["nulls"] > 0:
+            strategy = "median" if semantic_type.startswith("numeric") else "mode"
+            operations.append({"operation": "handle_missing_values", "column": names[column], "strategy": strategy})
+
+    return operations
+
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model with configurable latency and call/tool call counters."""
+
+    latency: float = 0.0
+    inspect_tool: Optional[str] = "table_info"
+    tokens_per_char: float = 0.25
+    stats: dict = Field(default_factory=lambda: {"calls": 0, "tool_calls": 0})
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def reset_stats(self) -> None:
+        with _stats_lock:
+            self.stats.update(calls=0, tool_calls=0)
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Any = None,
+            **kwargs
+        ) -> ChatResult:
+        time.sleep(self.latency)
+        tool_names = [tool["function"]["name"] for tool in kwargs.get("tools", [])]
+
+        if "FileContext" in tool_names:
+            message = self._index_message(messages)
+        else:
+            message = self._clean_message(messages, tool_names)
+
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        completion_chars = len(str(message.content)) + len(json.dumps([call["args"] for call in message.tool_calls]))
+        message.usage_metadata = {
+            "input_tokens": int(prompt_chars * self.tokens_per_char),
+            "output_tokens": int(completion_chars * self.tokens_per_char),
+            "total_tokens": int((prompt_chars + completion_chars) * self.tokens_per_char)
+        }
+        with _stats_lock:
+            self.stats["calls"] += 1
+            self.stats["tool_calls"] += len(message.tool_calls)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _index_message(self, messages: List[BaseMessage]) -> AIMessage:
+        prompt = str(messages[-1].content)
+        match = re.search(r"index the content of the file: (.+?) with the following content:\n", prompt)
+        file_name = match.group(1) if match else "unknown"
+        content = prompt[match.end():] if match else prompt
+        args = {
+            "file_name": file_name,
+            "file_type": file_name.rsplit(".", 1)[-1] if "." in file_name else "",
+            "description": f"Synthetic benchmark file {file_name} starting with: {content[:80]}",
+            "structure": "table" if file_name.endswith(("csv", "tsv", "xls", "xlsx")) else "typical text structure",
+            "metadata": f"{len(content)} characters of context"
+        }
+        return AIMessage(content="", tool_calls=[{"name": "FileContext", "args": args, "id": f"call_{len(messages)}"}])
+
+    def _clean_message(self, messages: List[BaseMessage], tool_names: List[str]) -> AIMessage:
+        n_tool_results = sum(isinstance(m, ToolMessage) for m in messages)
+        script = [name for name in [self.inspect_tool, "apply_cleaning_plan"] if name in tool_names]
+        if n_tool_results >= len(script):
+            return AIMessage(content="The data is cleaned.")
+
+        name = script[n_tool_results]
+        args = {}
+        if name == "apply_cleaning_plan":
+            first = next((m for m in messages if isinstance(m, HumanMessage)), None)
+            text = str(first.content) if first is not None else ""
+            profile = json.loads(text.split("Profile of the data:\n", 1)[1]) if "Profile of the data:\n" in text else {}
+            args = {"operations": plan_from_profile(profile or {})}
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{len(messages)}"}])
@@ -0,0 +1,125 @@
+"""Synthetic, seeded datasets for the benchmarks: wide/tall CSV, multi-sheet XLSX, large PDF and DOCX.
+
+The tabular files have the problems the cleaning agent is expected to fix: messy column
+names, numbers and dates stored as text, missing values, an empty column and duplicate rows.
+"""
+import os
+import numpy as np
+import pandas as pd
+from docx import Document
+
+SCALES = {
+    "small": {"tall_rows": 20_000, "wide_rows": 500, "wide_columns": 100, "sheet_rows": 2_000, "pdf_pages": 20, "docx_paragraphs": 500},
+    "medium": {"tall_rows": 500_000, "wide_rows": 2_000, "wide_columns": 300, "sheet_rows": 20_000, "pdf_pages": 200, "docx_paragraphs": 5_000},
+    "large": {"tall_rows": 5_000_000, "wide_rows": 10_000, "wide_columns": 1_000, "sheet_rows": 100_000, "pdf_pages": 1_000, "docx_paragraphs": 20_000}
+}
+
+WORDS = "data revenue customer region quarter forecast margin growth churn product order invoice shipment supplier".split()
+
+
+def messy_table(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Table with typical cleaning problems"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Order ID": np.arange(rows),
+        "Customer Name": rng.choice(["Alice", "Bob", "Carol", "Dave", "Eve"], rows),
+        "Region ": rng.choice(["North", "South", "East", "West"], rows),
+        "Order Date": pd.Series(pd.date_range("2020-01-01", periods=rows, freq="min")).dt.strftime("%Y-%m-%d %H:%M"),
+        "Amount (USD)": np.round(rng.gamma(2.0, 50.0, rows), 2).astype(str),
+        "Quantity": rng.integers(1, 20, rows).astype(float),
+        "Notes": rng.choice(WORDS, rows),
+        "Unused": np.nan
+    })
+    missing = rng.random(rows) < 0.05
+    df.loc[missing, "Quantity"] = np.nan
+    df.loc[rng.random(rows) < 0.02, "Customer Name"] = None
+    duplicates = df.sample(frac=0.01, random_state=seed)
+    return pd.concat([df, duplicates], ignore_index=True)
+
+
+def write_tall_csv(path: str, rows: int, seed: int = 0) -> None:
+    messy_table(rows, seed).to_csv(path, index=False)
+
+
+def write_wide_csv(path: str, rows: int, columns: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    data = {f"Metric {i} Value": np.round(rng.normal(100, 15, rows), 3) for i in range(columns)}
+    df = pd.DataFrame(data)
+    for i in range(0, columns, 7):
+        df.loc[rng.random(rows) < 0.1, f"Metric {i} Value"] = np.nan
+    df.insert(0, "Record Date", pd.Series(pd.date_range("2021-01-01", periods=rows, freq="h")).dt.strftime("%d/%m/%Y"))
+    df.to_csv(path, index=False)
+
+
+def write_multi_sheet_xlsx(path: str, rows: int, sheets: int = 3, seed: int = 0) -> None:
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for i in range(sheets):
+            messy_table(rows, seed + i).to_excel(writer, sheet_name=f"Sheet {i + 1}", index=False)
+
+
+def lorem(rng: np.random.Generator, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS, n_words))
+
+
+def write_pdf(path: str, pages: int, seed: int = 0) -> None:
+    """Write a text PDF by hand (one content stream per page, standard Helvetica font)"""
+    rng = np.random.default_rng(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        lines = [f"Page {page + 1} report"] + [lorem(rng, 12) for _ in range(40)]
+        text = "BT /F1 10 Tf 50 800 Td 14 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        stream = text.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids) + b"] /Count %d >>" % pages
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for i, obj in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % i + obj + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def write_docx(path: str, paragraphs: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    document = Document()
+    document.add_heading("Synthetic report", 0)
+    for i in range(paragraphs):
+        if i % 50 == 0:
+            document.add_heading(f"Section {i // 50 + 1}", 1)
+        document.add_paragraph(lorem(rng, 40))
+    document.save(path)
+
+
+def generate(data_path: str, scale: str = "small", seed: int = 0) -> dict[str, str]:
+    """Write every dataset of a scale to data_path.
+
+    Returns:
+        dict[str, str]: Dataset name to file path
+    """
+    sizes = SCALES[scale]
+    os.makedirs(data_path, exist_ok=True)
+    paths = {
+        "tall_csv": os.path.join(data_path, "tall.csv"),
+        "wide_csv": os.path.join(data_path, "wide.csv"),
+        "multi_sheet_xlsx": os.path.join(data_path, "multi_sheet.xlsx"),
+        "large_pdf": os.path.join(data_path, "report.pdf"),
+        "large_docx": os.path.join(data_path, "report.docx")
+    }
+    write_tall_csv(paths["tall_csv"], sizes["tall_rows"], seed)
+    write_wide_csv(paths["wide_csv"], sizes["wide_rows"], sizes["wide_columns"], seed)
+    write_multi_sheet_xlsx(paths["multi_sheet_xlsx"], sizes["sheet_rows"], seed=seed)
+    write_pdf(paths["large_pdf"], sizes["pdf_pages"], seed)
+    write_docx(paths["large_docx"], sizes["docx_paragraphs"], seed)
+    return paths
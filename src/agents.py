@@ -1,40 +1,129 @@
-from state import AgentState
+import threading
+from functools import wraps
+from typing import Callable, TypeVar
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
-from ui_agent_tools import start_graph_workflow
-from langchain.chat_models import init_chat_model
-from langgraph.prebuilt import create_react_agent
-from constants import DATA_CLEAN_AGENT_SYSTEM_PROMPT
-from data_clean_agent_tools import get_dataframe_tools
 from dotenv import load_dotenv
-load_dotenv()
+from llm_usage import llm_usage
+import constants
+
+T = TypeVar("T")
+
+
+def shared(build: Callable[[], T]) -> Callable[[], T]:
+    """Registry entry built on the first call and shared by the whole process afterwards.
+
+    Importing this module does not construct any models, each one is built (once, even if
+    several threads or Streamlit sessions ask for it at the same time) when first used.
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @wraps(build)
+    def get() -> T:
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(build())
+        return instance[0]
+
+    def override(value: T) -> None:
+        """Use another instance from now on, e.g. a fake model for benchmarks"""
+        with lock:
+            instance[:] = [value]
+
+    get.is_built = lambda: bool(instance)
+    get.override = override
+    return get
+
+
+@shared
+def load_env() -> None:
+    """Load the .env file once, before the first model is constructed"""
+    load_dotenv()
+
+
+@shared
+def get_llm_cache():
+    from llm_cache import SQLiteLLMCache
+    return SQLiteLLMCache(
+        constants.LLM_CACHE_PATH,
+        ttl_seconds=constants.LLM_CACHE_TTL_SECONDS,
+        max_bytes=constants.LLM_CACHE_MAX_BYTES
+    )
+
+
+def model_cache(role: str):
+    """Response cache of a model role ("ui", "data_cleaning", "indexing"), False if it opted out"""
+    return get_llm_cache() if constants.LLM_CACHE_MODELS.get(role, False) else False
+
+
+def with_retries(model):
+    """Retry transient errors of a model through `with_retry`, which reports each retry to the
+    callbacks (and so to the run metrics) unlike the retries inside the OpenAI client"""
+    import httpx
+    errors = [ConnectionError, TimeoutError, httpx.TransportError]
+    try:
+        import openai
+        errors += [openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError]
+    except ImportError:
+        pass
+    return model.with_retry(retry_if_exception_type=tuple(errors), stop_after_attempt=constants.LLM_MAX_ATTEMPTS)
 
 
 ## UI ##
 
-ui_llm = init_chat_model(
-    model="qwen3:4b",
-    model_provider="ollama",
-    base_url="http://localhost:11434",
-    temperature=0.1,
-    timeout=60
-).bind_tools([start_graph_workflow])
+@shared
+def get_ui_llm():
+    from langchain.chat_models import init_chat_model
+    from ui_agent_tools import start_graph_workflow
+    load_env()
+
+    return init_chat_model(
+        model="qwen3:4b",
+        model_provider="ollama",
+        base_url="http://localhost:11434",
+        temperature=0.1,
+        timeout=60,
+        callbacks=[llm_usage],
+        cache=model_cache("ui")
+    ).bind_tools([start_graph_workflow])
 
 
 ## Data Cleaning ##
 
-data_cleaning_llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.1
-)
+data_cleaning_model_name = "gpt-4o-mini"
+
+@shared
+def get_data_cleaning_llm():
+    from langchain_openai import ChatOpenAI
+    load_env()
+
+    return ChatOpenAI(
+        model=data_cleaning_model_name,
+        temperature=0.1,
+        callbacks=[llm_usage],
+        cache=model_cache("data_cleaning")
+    )
+
+def create_agent_data_clean(model):
+    from state import AgentState
+    from langgraph.prebuilt import create_react_agent
+    from constants import DATA_CLEAN_AGENT_SYSTEM_PROMPT
+    from data_clean_agent_tools import get_dataframe_tools
+    from message_budget import pre_model_hook
 
-# Create the agent
-agent_data_clean = create_react_agent(
-    model=data_cleaning_llm,
-    tools=get_dataframe_tools(),
-    prompt=DATA_CLEAN_AGENT_SYSTEM_PROMPT,
-    state_schema=AgentState
-)
+    # Create the agent
+    return create_react_agent(
+        model=model,
+        tools=get_dataframe_tools(),
+        prompt=DATA_CLEAN_AGENT_SYSTEM_PROMPT,
+        state_schema=AgentState,
+        pre_model_hook=pre_model_hook
+    )
+
+@shared
+def get_agent_data_clean():
+    return create_agent_data_clean(get_data_cleaning_llm())
 
 ## Indexing ##
 
@@ -47,14 +136,111 @@ class FileContext(BaseModel):
 
 use_openai = False
 
-if use_openai:
-    indexing_llm = ChatOpenAI(
-        model="gpt-4o-mini",
-    ).with_structured_output(FileContext)
-else:
-    indexing_llm = init_chat_model(
-        model="qwen3:8b",
+indexing_model_name = "gpt-4o-mini" if use_openai else "qwen3:8b"
+
+@shared
+def get_indexing_llm():
+    load_env()
+
+    if use_openai:
+        from langchain_openai import ChatOpenAI
+        return with_retries(ChatOpenAI(
+            model=indexing_model_name,
+            max_retries=0,
+            callbacks=[llm_usage],
+            cache=model_cache("indexing")
+        ).with_structured_output(FileContext))
+    else:
+        from langchain.chat_models import init_chat_model
+        return with_retries(init_chat_model(
+            model=indexing_model_name,
+            model_provider="ollama",
+            base_url="http://localhost:11434",
+            temperature=0,
+            callbacks=[llm_usage],
+            cache=model_cache("indexing")
+        ).with_structured_output(FileContext))
+
+
+## Routing ##
+# With constants.MODEL_ROUTING the roles pick a tier per file (see model_routing.py): the local
+# Ollama model for simple files, the hosted model of the role for the others and on failure
+
+local_model_name = "qwen3:8b"
+
+hosted_indexing_model_name = "gpt-4o-mini"
+
+@shared
+def get_local_llm():
+    from langchain.chat_models import init_chat_model
+    load_env()
+
+    return init_chat_model(
+        model=local_model_name,
         model_provider="ollama",
         base_url="http://localhost:11434",
-        temperature=0
-    ).with_structured_output(FileContext)
\ No newline at end of file
+        temperature=0,
+        callbacks=[llm_usage],
+        cache=model_cache("local")
+    )
+
+@shared
+def get_local_agent_data_clean():
+    return create_agent_data_clean(get_local_llm())
+
+@shared
+def get_local_indexing_llm():
+    return with_retries(get_local_llm().with_structured_output(FileContext))
+
+@shared
+def get_hosted_indexing_llm():
+    from langchain_openai import ChatOpenAI
+    load_env()
+
+    return with_retries(ChatOpenAI(
+        model=hosted_indexing_model_name,
+        max_retries=0,
+        callbacks=[llm_usage],
+        cache=model_cache("indexing")
+    ).with_structured_output(FileContext))
+
+
+def configure_models(
+        data_cleaning_model: str | None = None,
+        indexing_model: str | None = None,
+        indexing_use_openai: bool | None = None,
+        local_model: str | None = None,
+        hosted_indexing_model: str | None = None
+    ) -> None:
+    """Select the cleaning/indexing models, must be called before they are first used.
+
+    Args:
+        data_cleaning_model: OpenAI model of the data cleaning agent
+        indexing_model: Model of the indexing LLM
+        indexing_use_openai: Serve the indexing model from OpenAI instead of Ollama
+        local_model: Ollama model of the local tier of model routing
+        hosted_indexing_model: OpenAI model of the hosted indexing tier of model routing
+    """
+    global data_cleaning_model_name, indexing_model_name, use_openai, local_model_name, hosted_indexing_model_name
+
+    if local_model is not None:
+        if get_local_llm.is_built():
+            raise RuntimeError("The local model is already in use")
+        local_model_name = local_model
+
+    if hosted_indexing_model is not None:
+        if get_hosted_indexing_llm.is_built():
+            raise RuntimeError("The hosted indexing model is already in use")
+        hosted_indexing_model_name = hosted_indexing_model
+
+    if data_cleaning_model is not None:
+        if get_data_cleaning_llm.is_built():
+            raise RuntimeError("The data cleaning model is already in use")
+        data_cleaning_model_name = data_cleaning_model
+
+    if indexing_model is not None or indexing_use_openai is not None:
+        if get_indexing_llm.is_built():
+            raise RuntimeError("The indexing model is already in use")
+        if indexing_use_openai is not None:
+            use_openai = indexing_use_openai
+        indexing_model_name = indexing_model or ("gpt-4o-mini" if use_openai else "qwen3:8b")
@@ -1,13 +1,15 @@
 import os
 import uuid
-import time
 import graph
 import constants
 import os.path as osp
 import streamlit as st
 from state import AgentState
-from typing import List, Tuple
-from agents import ui_llm
+from run_progress import drop_progress
+from job_queue import JobQueue, QueuedRun
+from typing import Dict, List, Tuple
+from utils import spool_upload
+import agents
 from langgraph.graph.graph import CompiledGraph
 from langchain_core.messages import (
     BaseMessage,
@@ -25,7 +27,7 @@ if 'uuid' not in st.session_state:
     st.session_state.uuid = uuid
 
 if 'uploaded_files' not in st.session_state:
-    st.session_state.uploaded_files: List[Tuple[str, bytes]] = []  # List of (filename, file content)
+    st.session_state.uploaded_files: List[Dict] = []  # List of {name, path, content_hash, size}, the content is on disk
 
 if 'uploader_key' not in st.session_state:
     st.session_state.uploader_key = 0
@@ -36,6 +38,9 @@ if 'show_chat' not in st.session_state:
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history: List[Tuple[str, str]] = []  # List of (role, message)
 
+if 'graph_run' not in st.session_state:
+    st.session_state.graph_run: graph.BackgroundRun | QueuedRun | None = None
+
 if "agent_state" not in st.session_state:
     st.session_state.agent_state = AgentState(
         uuid=st.session_state.uuid,
@@ -44,6 +49,21 @@ if "agent_state" not in st.session_state:
         memory_path=osp.join('runs', st.session_state.uuid)
     )
 
+@st.cache_resource
+def get_ui_llm():
+    """UI model shared across all sessions of the app"""
+    return agents.get_ui_llm()
+
+@st.cache_resource
+def get_graph() -> CompiledGraph:
+    """Compiled graph shared across all sessions of the app, bound to a run's checkpointer on use"""
+    return graph.get_graph()
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Job queue in the runs directory shared with the worker processes"""
+    return JobQueue(osp.join('runs', constants.JOB_QUEUE_FILE_NAME))
+
 def invoke_llm() -> BaseMessage | CompiledGraph:
     """Invoke the LLM with the given prompt."""
 
@@ -52,7 +72,7 @@ def invoke_llm() -> BaseMessage | CompiledGraph:
     chat_history[-1].content += " /nothink"
 
     # Call the UI agent
-    response = ui_llm.invoke([SystemMessage(content=constants.UI_AGENT_SYSTEM_PROMPT)] + chat_history)
+    response = get_ui_llm().invoke([SystemMessage(content=constants.UI_AGENT_SYSTEM_PROMPT)] + chat_history)
 
     # Check if tool call (e.g. start_graph_workflow)
     if response.tool_calls:
@@ -69,29 +89,42 @@ def invoke_llm() -> BaseMessage | CompiledGraph:
         # Render tool call
         render_tool_meesage(f"Called tool: {tool_call["name"]} with args: {tool_call["args"]}")
         
-        return graph.create_graph()
+        return graph.with_checkpointer(get_graph(), graph.get_checkpointer(st.session_state.agent_state["memory_path"]))
 
     else: # Regular response  
         return response
         
 
 def handle_file_upload(uploaded_files) -> None:
-    """Store uploaded files in memory, avoiding duplicates.
+    """Write uploaded files to the run's data directory in chunks, skipping duplicate content.
+
+    Only the metadata of each file is kept in the session state.
     
     Args:
         uploaded_files: List of files uploaded through st.file_uploader
     """
     if uploaded_files:
-        current_filenames = {filename for filename, _ in st.session_state.uploaded_files}
+        data_path = osp.join(st.session_state.agent_state["memory_path"], "data")
         
         for uploaded_file in uploaded_files:
-            if uploaded_file.name not in current_filenames:
-                st.session_state.uploaded_files.append((uploaded_file.name, uploaded_file.getvalue()))
+            known_hashes = [file["content_hash"] for file in st.session_state.uploaded_files]
+            try:
+                file = spool_upload(uploaded_file, uploaded_file.name, data_path, known_hashes, constants.UPLOAD_CHUNK_BYTES)
+            except OSError as e:
+                print(f"Error writing upload {uploaded_file.name}: {e}")
+                continue
+            if file is not None:
+                st.session_state.uploaded_files.append(file)
     
-    st.session_state.uploader_key += 1  # Force widget reset
+    st.session_state.uploader_key += 1  # Force widget reset, releasing the uploaded buffers
 
 def clear_files() -> None:
     """Clear all uploaded files."""
+    for file in st.session_state.uploaded_files:
+        try:
+            os.remove(file["path"])
+        except OSError:
+            pass
     st.session_state.uploaded_files.clear()
     st.session_state.uploader_key += 1
 
@@ -118,6 +151,50 @@ def render_tool_meesage(message: str) -> None:
             unsafe_allow_html=True
         )
 
+@st.fragment(run_every=1)
+def render_graph_run() -> None:
+    """Poll the background graph run: per-stage file counts, finished nodes and cleaned files so far."""
+    run: graph.BackgroundRun | QueuedRun = st.session_state.graph_run
+    progress = run.progress
+
+    if run.done:
+        if run.output is not None and not run.cancelled and run.error is None:
+            st.session_state.agent_state = run.output
+            message = f"🎉 Data cleaning and indexing completed successfully in {run.elapsed:.0f} s. 🎉 \nYou can find the cleaned files in the output directory at {st.session_state.agent_state['memory_path']}"
+        elif run.cancelled:
+            message = "Data cleaning and indexing was cancelled. Finished files are kept, start the workflow again to resume."
+        else:
+            message = f"Data cleaning and indexing failed: {run.error}. Start the workflow again to resume."
+        st.session_state.chat_history.append(("assistant", message))
+        st.session_state.graph_run = None
+        drop_progress(st.session_state.uuid)
+        st.rerun()
+
+    counts = progress.counts()
+    with st.chat_message("assistant", avatar="🤖"):
+        st.markdown(f"**Data cleaning and indexing in progress** ({run.elapsed:.0f} s)")
+        for stage, label in [("clean", "Cleaned"), ("index", "Indexed")]:
+            stage_counts = counts.get(stage, {})
+            finished = sum(n for status, n in stage_counts.items() if status not in ["running", "pending"])
+            failed = stage_counts.get("error", 0) + stage_counts.get("failed", 0)
+            st.markdown(f"{label}: {finished} file(s) finished, {stage_counts.get('running', 0)} running, {failed} failed")
+
+        nodes = [event["name"] for event in progress.snapshot("node")]
+        if nodes:
+            st.caption(f"Finished steps: {', '.join(nodes)}")
+
+        with st.expander("Files"):
+            for event in progress.snapshot()[-50:]:
+                if event["stage"] == "node":
+                    continue
+                detail = event.get("output_path") or event.get("description") or event.get("error") or ""
+                st.markdown(f"`{event['stage']}` {osp.basename(event['name'])}: {event['status']} {detail}")
+
+        if progress.cancelled.is_set():
+            st.info("Cancelling, waiting for the running files to finish...")
+        elif st.button("Cancel", type="secondary"):
+            run.cancel()
+
 
 # Main UI
 st.title("Data Cleaning Agent 🧹")
@@ -127,9 +204,13 @@ if st.session_state.show_chat:
 
     # Render chat history
     render_chat_history() 
+
+    # Render progress of a running graph
+    if st.session_state.graph_run is not None:
+        render_graph_run()
     
     # Process user input
-    if (query := st.chat_input("Ask anything...")):
+    if (query := st.chat_input("Ask anything...", disabled=st.session_state.graph_run is not None)):
 
         # Add user query to chat history
         st.session_state.chat_history.append(("user", query)) # For streamlit rendering
@@ -149,37 +230,15 @@ if st.session_state.show_chat:
                 st.rerun()
             elif isinstance(response, CompiledGraph): # Compiled graph
 
-                render_tool_meesage(f"Writing uploaded files to memory at {st.session_state.agent_state['memory_path']}")
-                time.sleep(2)
-
-                # Write uploaded file to memory
-                for filename, file_content in st.session_state.uploaded_files:
-                    with open(os.path.join(st.session_state.agent_state["memory_path"], "data", filename), "wb") as f:
-                        f.write(file_content)
-
-                compiled_graph: CompiledGraph = response
-                render_tool_meesage(f"Invoking graph")
-                time.sleep(2)
-
-                # Create an empty container for the loading message
-                loading_container = st.empty()
-
-                # Show loading message in the container
-                with loading_container:
-                    with st.chat_message("assistant", avatar="🤖"):
-                        with st.spinner("Data cleaning and indexing in progress..."):
-                            # Invoke graph
-                            output = compiled_graph.invoke(st.session_state.agent_state)
-                            st.session_state.agent_state = output
-                
-                # Clear the loading message
-                loading_container.empty()
-
-                with st.chat_message("assistant", avatar="🤖"):
-                    st.markdown(f"🎉 Data cleaning and indexing completed successfully. 🎉 \nYou can find the cleaned files in the output directory at {st.session_state.agent_state['memory_path']}")
-                
-                # Exit application
-                st.stop()
+                # Run the graph in the background (or enqueue it for the workers), progress is rendered while it runs
+                if constants.USE_JOB_QUEUE:
+                    graph.close_checkpointer(response)  # The workers run the files without the graph
+                    st.session_state.chat_history.append(("tool", f"Enqueueing the files in {st.session_state.agent_state['memory_path']} for the workers"))
+                    st.session_state.graph_run = QueuedRun(get_job_queue(), st.session_state.agent_state)
+                else:
+                    st.session_state.chat_history.append(("tool", f"Invoking graph on the files in {st.session_state.agent_state['memory_path']}"))
+                    st.session_state.graph_run = graph.BackgroundRun(response, st.session_state.agent_state)
+                st.rerun()
             else:
                 print(f"Unknown response type: {type(response)}")
                 
@@ -246,8 +305,8 @@ with st.sidebar:
         with st.container():
             # Use markdown with HTML for the scrollable list
             file_items = '\n'.join(
-                f'<div class="file-item">{filename}</div>'
-                for filename, _ in st.session_state.uploaded_files
+                f'<div class="file-item">{file["name"]}</div>'
+                for file in st.session_state.uploaded_files
             )
             st.markdown(
                 f'<div class="file-list-container">{file_items}</div>',
@@ -0,0 +1,425 @@
+import os
+import random
+import numpy as np
+from itertools import chain
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+from data_clean_agent_tools import CONVERSIONS, optimize_dtypes, to_arrow_table, write_schema_sidecar
+
+
+## Reading ##
+
+def csv_separator(file_path: Union[str, Path]) -> str:
+    return '\t' if Path(file_path).suffix.lower() == '.tsv' else ','
+
+
+def estimate_row_count(file_path: Union[str, Path]) -> int:
+    """Estimate the number of rows of a csv/tsv file from the average line length of the first 64 KB."""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        head = f.read(64 * 1024)
+    average_line_length = max(1, len(head) / max(1, head.count(b'\n')))
+    return max(1, int(file_size / average_line_length))
+
+
+def estimate_memory_bytes(file_path: Union[str, Path], sample_rows: int = 1000) -> int:
+    """Estimate the in-memory size of a csv/tsv file after dtype optimization.
+
+    The first sample_rows rows are loaded and optimized, and their memory per row is
+    scaled by the estimated row count.
+    """
+    head = optimize_dtypes(pd.read_csv(file_path, sep=csv_separator(file_path), nrows=sample_rows))
+    if head.empty:
+        return 0
+    bytes_per_row = head.memory_usage(deep=True).sum() / len(head)
+    return int(bytes_per_row * estimate_row_count(file_path))
+
+
+def sample_tabular_data(file_path: Union[str, Path], n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Read a random sample of about n_rows rows from a csv/tsv file without loading it.
+
+    Rows are kept with a fixed probability based on the estimated row count, so the
+    sample covers the whole file.
+    """
+    keep_probability = min(1.0, n_rows / estimate_row_count(file_path))
+
+    rng = random.Random(seed)
+    return pd.read_csv(
+        file_path,
+        sep=csv_separator(file_path),
+        skiprows=lambda i: i > 0 and rng.random() >= keep_probability
+    ).head(n_rows)
+
+
+def iter_tabular_chunks(file_path: Union[str, Path], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Stream a csv/tsv file in chunks of chunk_rows rows."""
+    with pd.read_csv(file_path, sep=csv_separator(file_path), chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+## Replay ##
+
+STATISTIC_STRATEGIES = ['mean', 'median', 'mode']
+
+# Operations between two statistic fills that can carry the first fill into the second statistic
+ROW_DEPENDENT_TOOLS = ['rename_columns', 'remove_duplicates']
+
+
+class MedianSample:
+    """Bounded-memory median: a uniform sample of at most max_values values (bottom-k of random keys).
+
+    Exact as long as the column has at most max_values non-null values.
+    """
+
+    def __init__(self, max_values: int = 1_000_000, seed: int = 0):
+        self.max_values = max_values
+        self.rng = np.random.default_rng(seed)
+        self.values = np.empty(0)
+        self.keys = np.empty(0)
+
+    def add(self, series: pd.Series) -> None:
+        values = np.concatenate([self.values, series.to_numpy(dtype='float64')])
+        keys = np.concatenate([self.keys, self.rng.random(len(series))])
+        if len(values) > self.max_values:
+            keep = np.argpartition(keys, self.max_values)[:self.max_values]
+            values, keys = values[keep], keys[keep]
+        self.values, self.keys = values, keys
+
+    def median(self) -> Optional[float]:
+        return float(np.median(self.values)) if len(self.values) else None
+
+
+def statistic_levels(operations: List[Dict]) -> List[List[int]]:
+    """Group the indices of the mean/median/mode fills into levels that can be computed in one pass.
+
+    A fill depends on an earlier fill of the same column, or on any earlier fill if a rename,
+    duplicate removal or dropna between them can see the filled values. Fills of a level only
+    depend on fills of earlier levels.
+    """
+    levels: List[List[int]] = []
+    level_of: Dict[int, int] = {}
+    for index, operation in enumerate(operations):
+        if operation["tool"] != "handle_missing_values" or operation["args"]["strategy"] not in STATISTIC_STRATEGIES:
+            continue
+        level = 0
+        for earlier, earlier_level in level_of.items():
+            between = operations[earlier + 1:index]
+            if operations[earlier]["args"]["column"] == operation["args"]["column"] or any(
+                other["tool"] in ROW_DEPENDENT_TOOLS
+                or (other["tool"] == "handle_missing_values" and other["args"]["strategy"] == 'drop')
+                for other in between
+            ):
+                level = max(level, earlier_level + 1)
+        level_of[index] = level
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(index)
+    return levels
+
+
+class OperationReplayer:
+    """Replays recorded cleaning tool calls deterministically on a stream of chunks.
+
+    Operations are the {"tool": ..., "args": ...} records of DataFrameContext.operations.
+    Row-local operations are applied per chunk. Operations that depend on the whole file
+    carry state across chunks:
+        - mean/median/mode fills use statistics computed over the full file (resolve_statistics)
+        - remove_duplicates keeps the hashes of all rows seen so far
+        - ffill carries the last valid value into the next chunk
+        - bfill holds back trailing missing rows until a later chunk provides a value
+    """
+
+    def __init__(self, operations: List[Dict]):
+        self.operations = operations
+        self.statistics: Dict[int, Any] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the streaming state (seen hashes, carried and held back values)."""
+        self.seen_hashes: Dict[int, set] = {i: set() for i in range(len(self.operations))}
+        self.last_valid: Dict[int, Any] = {}
+        self.pending: Dict[int, pd.DataFrame] = {}
+
+    def resolve_statistics(self, chunks: Callable[[], Iterator[pd.DataFrame]]) -> None:
+        """Compute the fill values of mean/median/mode operations over the full file.
+
+        Independent fills are gathered in a single pass over the file, fills that depend on
+        earlier fills (see statistic_levels) in one more pass per dependency level. Each chunk
+        is replayed once per pass, up to each fill of the level in turn.
+
+        Args:
+            chunks: Callable returning a fresh iterator over the file chunks
+        """
+        for level in statistic_levels(self.operations):
+            totals = {index: [0.0, 0] for index in level}
+            medians = {index: MedianSample() for index in level}
+            counts: Dict[int, Optional[pd.Series]] = {index: None for index in level}
+
+            self.reset()
+            # The final empty chunk releases the rows held back by bfill operations
+            for chunk, final in chain(((chunk, False) for chunk in chunks()), [(pd.DataFrame(), True)]):
+                start = 0
+                for index in level:
+                    chunk = self.apply(chunk, start=start, stop=index, final=final)
+                    start = index
+                    column, strategy = self.operations[index]["args"]["column"], self.operations[index]["args"]["strategy"]
+                    if column not in chunk.columns:
+                        continue
+                    series = chunk[column].dropna()
+                    if strategy == 'mean':
+                        totals[index][0] += series.sum() if pd.api.types.is_numeric_dtype(series) else 0.0
+                        totals[index][1] += len(series)
+                    elif strategy == 'median':
+                        if pd.api.types.is_numeric_dtype(series):
+                            medians[index].add(series)
+                    else:
+                        chunk_counts = series.value_counts()
+                        counts[index] = chunk_counts if counts[index] is None else counts[index].add(chunk_counts, fill_value=0)
+
+            for index in level:
+                strategy = self.operations[index]["args"]["strategy"]
+                if strategy == 'mean' and totals[index][1]:
+                    self.statistics[index] = totals[index][0] / totals[index][1]
+                elif strategy == 'median' and medians[index].median() is not None:
+                    self.statistics[index] = medians[index].median()
+                elif strategy == 'mode' and counts[index] is not None and not counts[index].empty:
+                    # Same tie breaking as Series.mode()[0], the smallest of the most common values
+                    self.statistics[index] = sorted(counts[index][counts[index] == counts[index].max()].index)[0]
+
+        self.reset()
+
+    def apply(self, chunk: pd.DataFrame, start: int = 0, stop: Optional[int] = None, final: bool = False) -> pd.DataFrame:
+        """Apply the operations from index start up to index stop to a chunk.
+
+        Args:
+            chunk: Next chunk of the file
+            start: Only apply operations from this index on (the earlier ones were already applied)
+            stop: Only apply operations before this index
+            final: Whether this is the end of the stream, held back rows are released
+
+        Returns:
+            pd.DataFrame: The cleaned chunk
+        """
+        stop = len(self.operations) if stop is None else stop
+        for index in range(start, stop):
+            operation = self.operations[index]
+            if operation["tool"] == "handle_missing_values" and operation["args"]["strategy"] == 'bfill':
+                chunk = self.backward_fill(index, chunk, operation["args"]["column"], final)
+            elif not chunk.empty:
+                chunk = self.apply_operation(index, chunk, operation["tool"], operation["args"])
+        return chunk
+
+    def flush(self) -> pd.DataFrame:
+        """Release the rows held back by bfill operations at the end of the stream."""
+        return self.apply(pd.DataFrame(), final=True)
+
+    def apply_operation(self, index: int, chunk: pd.DataFrame, tool: str, args: Dict) -> pd.DataFrame:
+
+        if tool == "rename_columns":
+            return chunk.rename(columns=args["column_mapping"])
+
+        elif tool == "drop_columns":
+            return chunk.drop(columns=[col for col in args["columns"] if col in chunk.columns])
+
+        elif tool == "remove_duplicates":
+            subset = args.get("subset")
+            hashes = pd.util.hash_pandas_object(chunk[subset] if subset else chunk, index=False).to_numpy()
+            seen = self.seen_hashes[index]
+            # Membership per row of the chunk, linear in the chunk size however many rows were seen
+            keep = ~pd.Series(hashes).duplicated().to_numpy() & ~np.fromiter(map(seen.__contains__, hashes.tolist()), dtype=bool, count=len(hashes))
+            seen.update(hashes[keep].tolist())
+            return chunk[keep]
+
+        elif tool == "convert_column_type":
+            column, target_type = args["column"], args["target_type"]
+            if column not in chunk.columns:
+                return chunk
+            if target_type in CONVERSIONS:
+                chunk = chunk.assign(**{column: CONVERSIONS[target_type](chunk[column])})
+            return chunk
+
+        elif tool == "handle_missing_values":
+            column, strategy = args["column"], args["strategy"]
+            if column not in chunk.columns:
+                return chunk
+            chunk = chunk.copy()
+            if strategy == 'drop':
+                return chunk.dropna(subset=[column])
+            elif strategy in ['mean', 'median'] and not pd.api.types.is_numeric_dtype(chunk[column]):
+                return chunk
+            elif strategy in STATISTIC_STRATEGIES:
+                if index in self.statistics:
+                    chunk[column] = chunk[column].fillna(self.statistics[index])
+                return chunk
+            elif strategy == 'ffill':
+                chunk[column] = chunk[column].ffill()
+                if index in self.last_valid:
+                    chunk[column] = chunk[column].fillna(self.last_valid[index])
+                last_valid = chunk[column].last_valid_index()
+                if last_valid is not None:
+                    self.last_valid[index] = chunk[column].loc[last_valid]
+                return chunk
+
+        return chunk
+
+    def backward_fill(self, index: int, chunk: pd.DataFrame, column: str, final: bool) -> pd.DataFrame:
+
+        if index in self.pending:
+            chunk = pd.concat([self.pending.pop(index), chunk])
+        if chunk.empty or column not in chunk.columns:
+            return chunk
+
+        chunk = chunk.copy()
+        chunk[column] = chunk[column].bfill()
+
+        # Trailing missing values can only be filled by a later chunk
+        if not final:
+            missing = chunk[column].isna().to_numpy()
+            trailing = len(missing) if missing.all() else int(missing[::-1].argmin())
+            if trailing:
+                self.pending[index] = chunk.iloc[-trailing:]
+                chunk = chunk.iloc[:-trailing]
+
+        return chunk
+
+
+def output_schema(df: pd.DataFrame) -> pa.Schema:
+    """Arrow schema for streaming a cleaned table, from the dtypes of a (sample) DataFrame.
+
+    Types are widened so that every chunk of the full file can be converted to them: integers
+    to nullable int64, floats to float64, and text, categories and columns without any
+    value in the sample to string.
+    """
+    fields = []
+    for column in df.columns:
+        series = df[column]
+        if series.isna().all():
+            arrow_type = pa.string()
+        elif pd.api.types.is_bool_dtype(series):
+            arrow_type = pa.bool_()
+        elif pd.api.types.is_integer_dtype(series):
+            arrow_type = pa.int64()
+        elif pd.api.types.is_float_dtype(series):
+            arrow_type = pa.float64()
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            tz = getattr(series.dtype, 'tz', None)
+            arrow_type = pa.timestamp('ns', tz=str(tz) if tz is not None else None)
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(str(column), arrow_type))
+    return pa.schema(fields)
+
+
+def conform_chunk(chunk: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Convert a chunk to an Arrow table with the given schema.
+
+    Numeric and datetime columns are coerced (values that do not parse become null), so
+    columns that are empty at the start of the file or get missing values later do not
+    break the schema. Columns missing from the chunk are written as nulls.
+    """
+    arrays = []
+    for field in schema:
+        if field.name not in chunk.columns:
+            arrays.append(pa.nulls(len(chunk), field.type))
+            continue
+        series = chunk[field.name]
+        if pa.types.is_integer(field.type):
+            series = pd.to_numeric(series, errors='coerce')
+            values = series.dropna()
+            if not (values == values.round()).all():
+                raise ValueError(f"Column {field.name} has non-integer values that were not in the sample")
+            series = series.astype('Int64')
+        elif pa.types.is_floating(field.type):
+            series = pd.to_numeric(series, errors='coerce').astype('float64')
+        elif pa.types.is_boolean(field.type):
+            series = series.astype('boolean')
+        elif pa.types.is_timestamp(field.type):
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                series = pd.to_datetime(series, errors='coerce', format='mixed', utc=field.type.tz is not None)
+        else:
+            series = series.astype('string')
+        arrays.append(pa.Array.from_pandas(series).cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class TabularChunkWriter:
+    """Streams DataFrame chunks to a csv, parquet or feather/arrow file.
+
+    Columnar formats convert every chunk to a fixed schema (see output_schema), by default
+    derived from the first chunk. A schema sidecar is written on close.
+    """
+
+    def __init__(self, file_path: Union[str, Path], schema: Optional[pa.Schema] = None):
+        self.file_path = Path(file_path)
+        self.format = self.file_path.suffix.lower()
+        if self.format not in ['.csv', '.parquet', '.feather', '.arrow']:
+            raise ValueError(f"Unsupported output format: {self.format}")
+        self.writer = None
+        self.schema = schema
+        self.dtypes = None
+        self.rows = 0
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        """Write a chunk, empty chunks only matter if they are the first one (header/schema)."""
+        if self.dtypes is not None and chunk.empty:
+            return
+
+        if self.format == '.csv':
+            if self.writer is None:
+                self.writer = open(self.file_path, 'w', newline='')
+            chunk.to_csv(self.writer, index=False, header=self.dtypes is None)
+        else:
+            if self.schema is None:
+                self.schema = output_schema(chunk)
+            table = conform_chunk(chunk, self.schema)
+            if self.writer is None:
+                if self.format == '.parquet':
+                    self.writer = pq.ParquetWriter(self.file_path, self.schema, compression='zstd')
+                else:
+                    self.writer = pa.ipc.new_file(
+                        self.file_path, self.schema, options=pa.ipc.IpcWriteOptions(compression='zstd')
+                    )
+            self.writer.write_table(table)
+
+        if self.dtypes is None:
+            self.dtypes = chunk.dtypes if self.format == '.csv' else self.schema.empty_table().to_pandas().dtypes
+        self.rows += len(chunk)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            write_schema_sidecar(self.file_path, self.dtypes, self.rows)
+
+
+def replay_to_file(
+        file_path: Union[str, Path],
+        operations: List[Dict],
+        output_path: Union[str, Path],
+        chunk_rows: int,
+        sample: Optional[pd.DataFrame] = None
+    ) -> int:
+    """Replay recorded cleaning operations over the full file and stream the result to output_path.
+
+    The output format is given by the suffix of output_path (csv, parquet, feather/arrow).
+    The schema of columnar formats is derived from the cleaned sample if given, otherwise
+    from the first chunk.
+
+    Returns:
+        int: Number of rows written
+    """
+    replayer = OperationReplayer(operations)
+    replayer.resolve_statistics(lambda: iter_tabular_chunks(file_path, chunk_rows))
+
+    writer = TabularChunkWriter(output_path, output_schema(sample) if sample is not None else None)
+    try:
+        for chunk in iter_tabular_chunks(file_path, chunk_rows):
+            writer.write(replayer.apply(chunk))
+        writer.write(replayer.flush())
+    finally:
+        writer.close()
+
+    return writer.rows
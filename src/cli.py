@@ -0,0 +1,227 @@
+"""Headless batch processing of files without the Streamlit app or the UI agent.
+
+    python src/cli.py data/incoming "exports/**/*.xlsx" --output runs/nightly --clean-concurrency 8
+
+The output directory is the run directory: inputs are linked into <output>/data and the
+cleaned files, index.txt and vector index are written to <output>/output. The run id is
+derived from the output directory, so running the same command again resumes the run.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import shutil
+import argparse
+from datetime import datetime
+import constants
+from state import AgentState
+from index_cache import hash_file
+from llm_usage import llm_usage
+
+
+def collect_inputs(inputs: list[str]) -> list[tuple[str, str]]:
+    """Resolve input directories, files and glob patterns.
+
+    Returns:
+        list[tuple[str, str]]: (source path, path relative to the data directory), directories keep their structure
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files_ in os.walk(item):
+                for file in files_:
+                    source = os.path.join(root, file)
+                    files.append((source, os.path.join(os.path.basename(os.path.normpath(item)), os.path.relpath(source, item))))
+        else:
+            matches = glob.glob(item, recursive=True) if glob.has_magic(item) else [item]
+            for source in matches:
+                if os.path.isfile(source):
+                    files.append((source, os.path.basename(source)))
+                else:
+                    print(f"Skipping {source}, not a file")
+    return sorted(files)
+
+
+def stage_inputs(files: list[tuple[str, str]], data_path: str) -> list[str]:
+    """Hard link (or copy) the inputs into the data directory, unchanged files of an earlier run are kept.
+
+    Returns:
+        list[str]: Paths in the data directory
+    """
+    staged = []
+    for source, relative_path in files:
+        target = os.path.join(data_path, relative_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        stem, suffix = os.path.splitext(target)
+        n = 1
+        while target in staged:
+            target, n = f"{stem} ({n}){suffix}", n + 1
+        if os.path.exists(target):
+            if hash_file(target) == hash_file(source):
+                staged.append(target)
+                continue
+            os.remove(target)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+        staged.append(target)
+    return staged
+
+
+def count_cleaned_rows(events: list[dict]) -> int:
+    """Total rows of the files cleaned in this invocation, read from the schema sidecars of
+    their outputs (files skipped as already cleaned are not counted)"""
+    rows = 0
+    for event in events:
+        if event["stage"] != "clean" or event["status"] != "done" or "output_path" not in event:
+            continue
+        try:
+            with open(f"{event['output_path']}.schema.json", "r") as f:
+                rows += json.load(f).get("rows", 0)
+        except (OSError, ValueError):
+            pass
+    return rows
+
+
+def stage_times(events: list[dict]) -> dict[str, dict[str, float]]:
+    """Wall time span and summed per-file busy time of each stage from the progress events"""
+    times = {}
+    started = {}
+    for event in events:
+        if event["stage"] == "node":
+            continue
+        timestamp = datetime.fromisoformat(event["time"]).timestamp()
+        stage = times.setdefault(event["stage"], {"first": timestamp, "last": timestamp, "busy_s": 0.0, "files": 0})
+        stage["first"], stage["last"] = min(stage["first"], timestamp), max(stage["last"], timestamp)
+        key = (event["stage"], event["name"])
+        if event["status"] == "running":
+            started[key] = timestamp
+        else:
+            stage["files"] += 1
+            if key in started:
+                stage["busy_s"] += timestamp - started.pop(key)
+    return {
+        stage: {"wall_s": values["last"] - values["first"], "busy_s": values["busy_s"], "files": values["files"]}
+        for stage, values in times.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Clean and index files without the UI")
+    parser.add_argument("inputs", nargs="+", help="Input directories, files or glob patterns")
+    parser.add_argument("--output", "-o", required=True, help="Run directory for the data, cleaned files and index")
+    parser.add_argument("--clean-concurrency", type=int, default=constants.DATA_CLEAN_AGENT_MAX_CONCURRENCY)
+    parser.add_argument("--index-concurrency", type=int, default=constants.INDEX_AGENT_MAX_CONCURRENCY)
+    parser.add_argument("--memory-budget-mb", type=int, default=constants.CLEAN_MEMORY_BUDGET_BYTES // 1024**2)
+    parser.add_argument("--output-format", choices=["csv", "parquet", "feather"], default=constants.CLEANED_OUTPUT_FORMAT)
+    parser.add_argument("--cleaning-model", default=None, help="OpenAI model of the data cleaning agent")
+    parser.add_argument("--indexing-model", default=None, help="Model of the indexing LLM")
+    parser.add_argument("--indexing-provider", choices=["ollama", "openai"], default=None)
+    parser.add_argument("--local-model", default=None, help="Ollama model for the files routed to the local tier")
+    parser.add_argument("--hosted-indexing-model", default=None, help="OpenAI model for the files routed to the hosted indexing tier")
+    parser.add_argument("--no-routing", action="store_true", help="Use the cleaning/indexing model for every file instead of routing per file")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Do not use the persistent LLM response cache")
+    parser.add_argument("--no-resume", action="store_true", help="Start a new run instead of resuming the last one")
+    parser.add_argument("--summary", default=None, help="Write the throughput summary as JSON to this file")
+    parser.add_argument("--profile-nodes", action="store_true", help="Save a cProfile of every graph node to <output>/output/profiles")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    # Models are selected before the graph is imported and built
+    import agents
+    if args.no_llm_cache:
+        constants.LLM_CACHE_MODELS = {}
+    if args.no_routing:
+        constants.MODEL_ROUTING = False
+    agents.configure_models(
+        data_cleaning_model=args.cleaning_model,
+        indexing_model=args.indexing_model,
+        indexing_use_openai=None if args.indexing_provider is None else args.indexing_provider == "openai",
+        local_model=args.local_model,
+        hosted_indexing_model=args.hosted_indexing_model
+    )
+    import graph
+    from run_progress import get_progress
+    from metrics import get_metrics, drop_metrics
+
+    memory_path = os.path.abspath(args.output)
+    data_path, output_path = os.path.join(memory_path, "data"), os.path.join(memory_path, "output")
+    os.makedirs(output_path, exist_ok=True)
+
+    files = stage_inputs(collect_inputs(args.inputs), data_path)
+    if not files:
+        print("No input files found")
+        sys.exit(1)
+    print(f"Processing {len(files)} files into {memory_path}")
+
+    run_id = uuid.uuid5(uuid.NAMESPACE_URL, memory_path)
+    if args.no_resume:
+        run_id = uuid.uuid4()
+    state = AgentState(
+        uuid=str(run_id),
+        messages=[],
+        debug=args.debug,
+        memory_path=memory_path,
+        clean_concurrency=args.clean_concurrency,
+        index_concurrency=args.index_concurrency,
+        memory_budget_bytes=args.memory_budget_mb * 1024**2,
+        output_format=args.output_format,
+        profile_nodes=args.profile_nodes
+    )
+
+    app = graph.with_checkpointer(graph.get_graph(), graph.get_checkpointer(memory_path))
+    progress = get_progress(state["uuid"])
+    node_times = {}
+    start = time.perf_counter()
+    try:
+        for mode, chunk in graph.stream_graph(app, state):
+            if mode == "updates":
+                for node in chunk:
+                    node_times[node] = time.perf_counter() - start
+                    print(f"[{node_times[node]:8.1f} s] {node} finished")
+    finally:
+        graph.close_checkpointer(app)
+    elapsed = time.perf_counter() - start
+
+    rows = count_cleaned_rows(progress.snapshot())
+    counts = progress.counts()
+    metrics_summary = get_metrics(state["uuid"]).summary()
+    summary = {
+        "files": len(files),
+        "elapsed_s": elapsed,
+        "files_per_s": len(files) / elapsed if elapsed > 0 else 0.0,
+        "cleaned_rows": rows,
+        "rows_per_s": rows / elapsed if elapsed > 0 else 0.0,
+        "llm": llm_usage.snapshot(),
+        "llm_cache": agents.get_llm_cache().stats() if agents.get_llm_cache.is_built() else None,
+        "stages": stage_times(progress.snapshot()),
+        "nodes_finished_at_s": node_times,
+        "file_status": counts,
+        "routing": metrics_summary["routing"],
+        "retries": {source: values["count"] for source, values in metrics_summary["retry"].items()}
+    }
+    drop_metrics(state["uuid"])
+
+    print(f"\n{summary['files']} files in {elapsed:.1f} s ({summary['files_per_s']:.2f} files/s), {rows} cleaned rows ({summary['rows_per_s']:.0f} rows/s)")
+    print(f"LLM: {summary['llm']['calls']} calls, {summary['llm']['errors']} errors, {summary['llm']['prompt_tokens']} prompt + {summary['llm']['completion_tokens']} completion tokens")
+    if summary["llm_cache"] is not None:
+        print(f"LLM cache: {summary['llm_cache']['hits']} hits, {summary['llm_cache']['misses']} misses")
+    for stage, values in summary["stages"].items():
+        print(f"{stage:<6} {values['files']} files, {values['wall_s']:.1f} s wall, {values['busy_s']:.1f} s busy, status {counts.get(stage, {})}")
+    for tier, values in summary["routing"].items():
+        print(f"Routing {tier}: {values['count']} runs, {values['errors']} failed, {values['latency_s_sum'] / values['count']:.1f} s per run")
+    if summary["retries"]:
+        print(f"Retries: {', '.join(f'{n} {source}' for source, n in summary['retries'].items())}")
+
+    print(f"Metrics: {os.path.join(output_path, constants.METRICS_FILE_NAME)}, {os.path.join(output_path, constants.METRICS_PROMETHEUS_FILE_NAME)}")
+
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,9 +27,91 @@ clean it using the available tools. Tasks such as renaming columns, dropping col
 duplicates, converting data types of columns, and handling missing values are available and expected tasks.
 You should decide which tasks to perform based on the data sample and the available tools.
 
-The dataframe is passed directly to the tools using the global variable `current_dataframe` so you need to use the tools to modify the dataframe (do not pass any dataframes to the tools).
+The dataframe is passed directly to the tools through the run configuration so you need to use the tools to modify the dataframe (do not pass any dataframes to the tools).
 Some of the tools give descriptions of the current dataframe, such as the number of rows and columns, the column names, the data types, and the null counts. Use this information to make your decisions.
+A profile of the dataframe (null counts, cardinality, inferred semantic types, parse rates and top values of each column) is given in the first message, so only call the description tools if you need more detail.
 Other tools will modify the dataframe in-place and return a status message. Use this information to make your decisions.
+Prefer `apply_cleaning_plan` to apply all the cleaning operations you decided on in a single call instead of calling the modifying tools one at a time.
+If a modification was a mistake, use `undo` or `checkout` to restore an earlier version of the dataframe instead of trying to repair it.
 Once you have cleaned the dataframe, it will automatically be saved to a new file in the memory path (you do not need to save it manually).
 """
 
+
+# Maximum number of files described by the indexing LLM at the same time
+INDEX_AGENT_MAX_CONCURRENCY = 8
+
+# Persistent cache of indexing results shared across runs
+INDEX_CACHE_DIR = "cache/index"
+INDEX_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Maximum number of files cleaned by the data cleaning agent at the same time
+DATA_CLEAN_AGENT_MAX_CONCURRENCY = 4
+
+# csv/tsv files whose estimated in-memory size exceeds this budget are cleaned out-of-core:
+# the agent plans on a sample and the recorded operations are replayed over the full file in chunks
+CLEAN_MEMORY_BUDGET_BYTES = 1024 * 1024 * 1024
+OUT_OF_CORE_SAMPLE_ROWS = 10_000
+OUT_OF_CORE_CHUNK_ROWS = 100_000
+
+# Persistent cache of cleaning plans (recorded tool calls) keyed by schema fingerprint
+PLAN_CACHE_DIR = "cache/plans"
+PLAN_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Format of the cleaned output files: "csv", "parquet" or "feather" (a .schema.json sidecar is written next to each)
+CLEANED_OUTPUT_FORMAT = "parquet"
+
+# Structured index (SQLite) written next to index.txt in the output directory
+INDEX_STORE_FILE_NAME = "index.db"
+
+# Embedder for the vector index in the output directory: "hashing" (offline) or "ollama:<model>"
+INDEX_EMBEDDER = "hashing"
+VECTOR_INDEX_DIR_NAME = "vectors"
+
+# Run directory files for resuming: per-file completion markers and LangGraph checkpoints
+RUN_MANIFEST_FILE_NAME = "manifest.json"
+CHECKPOINT_FILE_NAME = "checkpoints.sqlite"
+
+# File extensions that go through the data cleaning agent, all other files are only indexed
+TABULAR_FORMATS = ["csv", "tsv", "xls", "xlsx", "parquet", "feather", "arrow"]
+
+# Uploads are copied to the run's data directory in chunks of this size as they arrive
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Job queue in the runs directory, the app enqueues runs for worker processes (src/worker.py) instead of
+# running the graph itself when enabled
+USE_JOB_QUEUE = False
+JOB_QUEUE_FILE_NAME = "queue.sqlite"
+JOB_LEASE_SECONDS = 300
+JOB_MAX_ATTEMPTS = 3
+JOB_POLL_SECONDS = 2
+
+# Run metrics (LLM calls, tool calls, graph nodes) exported to the output directory, optionally with a cProfile per node
+METRICS_FILE_NAME = "metrics.json"
+METRICS_PROMETHEUS_FILE_NAME = "metrics.prom"
+PROFILE_NODES = False
+
+# Persistent exact-match cache of model responses, shared across runs. Models can opt out per role
+LLM_CACHE_PATH = "cache/llm.sqlite"
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LLM_CACHE_MODELS = {"ui": True, "data_cleaning": True, "indexing": True, "local": True}
+
+# Attempts of the indexing models on transient errors (connection, timeout, rate limit, server error),
+# retried through `with_retry` so the run metrics count them
+LLM_MAX_ATTEMPTS = 3
+
+# Context of the cleaning agent: tool outputs are clipped and, beyond the token budget, older outputs are elided
+CLEAN_AGENT_CONTEXT_TOKEN_BUDGET = 8000
+CLEAN_AGENT_TOOL_OUTPUT_MAX_CHARS = 4000
+CLEAN_AGENT_KEEP_RECENT_TOOL_OUTPUTS = 2
+CLEAN_SUMMARY_MAX_CHARS = 500
+
+# Model routing per file: files with a simple profile go to the local model, the others (and local runs
+# whose tool calls or structured output fail) to the hosted model of the role
+MODEL_ROUTING = True
+ROUTING_MAX_COLUMNS = 30
+ROUTING_MAX_NULL_RATIO = 0.2
+ROUTING_MAX_TYPE_PROBLEMS = 2
+ROUTING_MAX_FILE_BYTES = 5 * 1024 * 1024
+ROUTING_HOSTED_FILE_TYPES = []
+ROUTING_MAX_TOOL_FAILURES = 2
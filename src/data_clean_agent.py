@@ -1,50 +1,269 @@
 import os
+import json
+import time
+import constants
 from tqdm import tqdm
 from state import AgentState
-from agents import agent_data_clean
-from data_clean_agent_tools import load_tabular_data, set_dataframe, get_dataframe
+from plan_cache import CleaningPlanCache
+from run_manifest import RunManifest
+from metrics import get_metrics
+from message_budget import summarize_cleaning
+from model_routing import LOCAL, route_table, escalated_route, tool_failures, cleaning_agent, cache_model_name, record_route
+from run_progress import get_progress, RunCancelled
+from index_cache import hash_file
+from typing import Callable, Optional
+from utils import list_data_files
+from index_agent import index_files
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from data_clean_agent_tools import (
+    load_tabular_data,
+    save_tabular_data,
+    optimize_dtypes,
+    memory_usage_mb,
+    replay_operations,
+    get_profile,
+    DataFrameContext
+)
+from cleaning_replay import sample_tabular_data, estimate_memory_bytes, replay_to_file
 from langchain.schema import HumanMessage
 
+
+def load_file(file: str, out_of_core: bool, debug: bool = False):
+    """Load a tabular file (or a sample of it for out-of-core cleaning) with optimized dtypes."""
+    if out_of_core:
+        df = sample_tabular_data(file, constants.OUT_OF_CORE_SAMPLE_ROWS)
+    else:
+        df = load_tabular_data(file, optimize=False)
+    optimized_df = optimize_dtypes(df)
+    if debug:
+        print(f"Loaded {os.path.basename(file)}: {memory_usage_mb(df):.1f} MB, {memory_usage_mb(optimized_df):.1f} MB after dtype optimization")
+    return optimized_df
+
+
+def cleaned_file_name(file: str, memory_path: str, output_format: str) -> str:
+    """Name of the cleaned output of a data file, unique per path in the data directory.
+
+    data/exports/jan/a.csv becomes cleaned_exports__jan__a.csv.<output_format>, so files
+    with the same name in different directories or with different extensions do not collide.
+    """
+    relative_path = os.path.relpath(os.path.abspath(file), os.path.abspath(os.path.join(memory_path, "data")))
+    if relative_path.startswith(os.pardir):
+        relative_path = os.path.basename(file)
+    return f"cleaned_{relative_path.replace(os.sep, '__')}.{output_format}"
+
+
+def clean_file(file: str, state: AgentState, plan_cache: CleaningPlanCache, manifest: RunManifest) -> dict:
+    """Clean a single tabular file with its own dataframe context and save the result.
+
+    If a file with the same schema fingerprint was cleaned before, the cached plan is
+    replayed through the tools without the LLM, falling back to the agent if it fails.
+    Large csv/tsv files are cleaned out-of-core: the agent works on a sample and its
+    recorded operations are replayed over the full file in chunks.
+    With model routing the agent runs on the local or the hosted model depending on the
+    profile of the data, a local run that raises or whose tool calls keep failing is
+    repeated on the hosted model.
+    Files already completed in the run manifest (same content, output present) are skipped.
+
+    The agent's transcript stays local to this call, only a compact summary of the file
+    is returned for the shared state.
+
+    Returns:
+        dict: {"file_summaries": {file: summary}}, or an empty dict if the file was skipped or could not be cleaned
+    """
+
+    progress = get_progress(state.get("uuid"))
+    try:
+        content_hash = hash_file(file)
+        completed = manifest.get("clean", file)
+        if manifest.is_done("clean", file, content_hash) and os.path.exists(completed["output_path"]):
+            if state["debug"]:
+                print(f"Skipping {file}, already cleaned in this run")
+            progress.report("clean", file, "skipped", output_path=completed["output_path"])
+            return {}
+        progress.report("clean", file, "running")
+
+        # csv/tsv files that would not fit in the memory budget are cleaned out-of-core
+        out_of_core = False
+        if os.path.splitext(file)[1].lower() in [".csv", ".tsv"]:
+            estimated_bytes = estimate_memory_bytes(file)
+            out_of_core = estimated_bytes > state.get("memory_budget_bytes", constants.CLEAN_MEMORY_BUDGET_BYTES)
+            if state["debug"]:
+                print(f"Estimated memory for {os.path.basename(file)}: {estimated_bytes / 1024**2:.1f} MB (out-of-core: {out_of_core})")
+
+        # Load in data file (or a sample of it) into a context that the tools resolve from the config
+        context = DataFrameContext(load_file(file, out_of_core, state["debug"]))
+        metrics = get_metrics(state.get("uuid"))
+        config = {
+            "recursion_limit": 30,
+            "configurable": {"dataframe_context": context, "metrics": metrics},
+            "callbacks": [metrics.callback]
+        }
+        plan_key = plan_cache.key(context.df)
+        plan = plan_cache.get(plan_key)
+        messages = []
+
+        # Replay a cached plan for the same schema
+        replayed = False
+        if plan is not None:
+            try:
+                replayed = replay_operations(plan, config)
+            except Exception as e:
+                print(f"Error replaying cleaning plan for {file}: {str(e)}")
+            if not replayed:
+                context.reset(load_file(file, out_of_core, state["debug"]))
+                metrics.record("retry", {"source": "replay", "stage": "clean", "file": file, "reason": "cached cleaning plan failed"})
+            elif state["debug"]:
+                print(f"Replayed cached cleaning plan for {file}")
+
+        if not replayed:
+            # Run agent with state on the model routed from the profile
+            tier, route = route_table(get_profile(config))
+            while True:
+                start = time.perf_counter()
+                error = None
+                try:
+                    result = cleaning_agent(tier).invoke(
+                        {"messages": [HumanMessage(content=(
+                            "Please clean the data by using the available tools.\n"
+                            f"Profile of the data:\n{json.dumps(get_profile(config))}"
+                        ))]},
+                        config=config,
+                        debug=state["debug"]
+                    )
+                    messages = result.get("messages", [])
+                    failures = tool_failures(messages)
+                    if tier == LOCAL and failures >= constants.ROUTING_MAX_TOOL_FAILURES:
+                        error = f"{failures} failed tool calls"
+                except Exception as e:
+                    error = str(e)
+                    if tier != LOCAL:
+                        record_route(metrics, "clean", file, tier, route, time.perf_counter() - start, error)
+                        raise
+                record_route(metrics, "clean", file, tier, route, time.perf_counter() - start, error)
+                if error is None or tier != LOCAL:
+                    break
+                if state["debug"]:
+                    print(f"Escalating {file} to the hosted model after: {error}")
+                context.reset(load_file(file, out_of_core, state["debug"]))
+                tier, route = escalated_route(error)
+                metrics.record("retry", {"source": "escalation", "stage": "clean", "file": file, "reason": error})
+            plan_cache.put(plan_key, context.operations)
+
+        if state["debug"]:
+            print(f"Cleaned {os.path.basename(file)}: {memory_usage_mb(context.df):.1f} MB")
+
+        # Save cleaned file in the configured output format
+        output_format = state.get("output_format", constants.CLEANED_OUTPUT_FORMAT)
+        cleaned_file_path = os.path.join(state["memory_path"], "output", cleaned_file_name(file, state["memory_path"], output_format))
+        if out_of_core:
+            replay_to_file(file, context.operations, cleaned_file_path, constants.OUT_OF_CORE_CHUNK_ROWS, sample=context.df)
+        else:
+            save_tabular_data(context.df, cleaned_file_path)
+
+        manifest.mark_done("clean", file, content_hash, output_path=cleaned_file_path)
+        progress.report("clean", file, "done", output_path=cleaned_file_path, replayed=replayed)
+        return {"file_summaries": {file: summarize_cleaning(messages, context.operations, cleaned_file_path, context.df.shape, replayed)}}
+    except Exception as e:
+        print(f"Error cleaning {file}: {str(e)}")
+        progress.report("clean", file, "error", error=str(e))
+        return {}
+
+
+def clean_files(
+        tabular_files: list[str],
+        state: AgentState,
+        on_cleaned: Optional[Callable[[str], None]] = None
+    ) -> list[dict]:
+    """Clean tabular files concurrently, a limit of 1 cleans them one after another.
+
+    Args:
+        tabular_files: Files to clean
+        state: Graph state with the run directory and settings
+        on_cleaned: Called with the file path as soon as a file is finished
+
+    Returns:
+        list[dict]: The per-file results of clean_file in order of completion
+
+    Raises:
+        RunCancelled: If the run was cancelled, files that already started are finished first
+    """
+    progress = get_progress(state.get("uuid"))
+    manifest = RunManifest(os.path.join(state["memory_path"], constants.RUN_MANIFEST_FILE_NAME))
+    plan_cache = CleaningPlanCache(
+        constants.PLAN_CACHE_DIR,
+        model_name=cache_model_name("data_cleaning"),
+        prompt=constants.DATA_CLEAN_AGENT_SYSTEM_PROMPT,
+        max_bytes=constants.PLAN_CACHE_MAX_BYTES
+    )
+
+    def clean_unless_cancelled(file: str) -> dict:
+        progress.check_cancelled()
+        return clean_file(file, state, plan_cache, manifest)
+
+    results = []
+    max_workers = state.get("clean_concurrency", constants.DATA_CLEAN_AGENT_MAX_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(clean_unless_cancelled, file): file for file in tabular_files}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Processing files"):
+            results.append(future.result())
+            if on_cleaned is not None:
+                on_cleaned(futures[future])
+
+    if state["debug"]:
+        print(f"Cleaning plan cache: {plan_cache.stats()}")
+
+    return results
+
+
 def data_clean_agent(state: AgentState) -> AgentState:
 
     if state["debug"]:
         print(f"Entered data_clean_agent")
 
-    # Load in data files from memory path
-    file_paths = []
-    data_path = os.path.join(state["memory_path"], "data")
-    for root, dirs, files_ in os.walk(data_path):
-        for file in files_:
-            file_paths.append(os.path.abspath(os.path.join(root, file)))
+    # Load in data files from memory path and filter out only tabular files
+    file_paths = list_data_files(state["memory_path"])
+    tabular_files = list(filter(lambda x: x.split(".")[-1] in constants.TABULAR_FORMATS, file_paths))
 
-    tabular_formats = ["csv", "tsv", "xls", "xlsx"]
+    for result in clean_files(tabular_files, state):
+        state["file_summaries"] = {**state.get("file_summaries", {}), **result.get("file_summaries", {})}
 
-    # Filter out only tabular files
-    tabular_files = list(filter(lambda x: x.split(".")[-1] in tabular_formats, file_paths))
+    return state
 
-    for file in tqdm(tabular_files, desc="Processing files"):
 
-        # Load in data file
-        df = load_tabular_data(file)
-        set_dataframe(df)
+def clean_and_index_agent(state: AgentState) -> dict:
+    """Graph branch cleaning the tabular files, each file is indexed as soon as it is cleaned.
 
-        # Run agent with state
-        result = agent_data_clean.invoke(
-            HumanMessage(content="Please clean the data by using the available tools."),
-            config={"recursion_limit": 30},
-            debug=state["debug"]
-        )
-        state.update(result)  # Update state with any changes from the agent
+    Runs in parallel with the indexing of the non-tabular files, so it only returns the
+    keys it changes.
+    """
 
-        # Save cleaned file
-        cleaned_file_name = f"cleaned_{os.path.basename(file)}"
-        cleaned_file_path = os.path.join(state["memory_path"], "output", cleaned_file_name)
-        cleaned_df = get_dataframe()
-        cleaned_df.to_csv(cleaned_file_path, index=False)
+    if state["debug"]:
+        print(f"Entered clean_and_index_agent with {len(state.get('tabular_files', []))} files")
 
-    return state
+    summaries = {}
+    index_futures = []
+    max_workers = state.get("index_concurrency", constants.INDEX_AGENT_MAX_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as index_executor:
+        results = clean_files(
+            state.get("tabular_files", []),
+            state,
+            on_cleaned=lambda file: index_futures.append(index_executor.submit(index_files, [file], state))
+        )
+        for result in results:
+            summaries.update(result.get("file_summaries", {}))
+
+        for future in index_futures:
+            try:
+                future.result()
+            except RunCancelled:
+                pass
+            except Exception as e:
+                print(f"Error indexing cleaned file: {str(e)}")
 
+    # Files that were not indexed before the run was cancelled are picked up when it resumes
+    get_progress(state.get("uuid")).check_cancelled()
 
+    return {"file_summaries": summaries}
 
 
 if __name__ == "__main__":
@@ -59,4 +278,4 @@ if __name__ == "__main__":
 
     output_state = data_clean_agent(state)
 
-    print(output_state)
\ No newline at end of file
+    print(output_state)
@@ -1,48 +1,335 @@
 import json
+import time
+from functools import wraps
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
 from pathlib import Path
 from langchain_core.tools import tool
-from typing import Dict, List, Optional, Union
+from langchain_core.runnables import RunnableConfig
+from typing import Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, Field
 
-## Global variable ##
+# Copy-on-write (default from pandas 3) lets derived frames share memory until they are modified
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
-current_dataframe: pd.DataFrame | None = None
+## DataFrame context ##
 
-def set_dataframe(df: pd.DataFrame):
-    """Set the global dataframe for tools to use"""
-    global current_dataframe
-    current_dataframe = df.copy()
+class DataFrameContext:
+    """Holds the dataframe of a single agent invocation.
 
-def get_dataframe():
-    """Get the current dataframe"""
-    global current_dataframe
-    return current_dataframe
+    The context is passed to the agent through config["configurable"]["dataframe_context"]
+    and resolved by the tools at call time, so several files (or sessions) can be cleaned
+    concurrently without sharing state. Every modifying tool call is recorded in
+    `operations` so it can be replayed on the full file (see cleaning_replay.py).
+
+    After each modification a version is committed to a bounded history so the agent can
+    undo or check out earlier states. Versions are shallow copies, with copy-on-write
+    enabled they share the buffers of all columns that were not modified since.
+    """
+
+    def __init__(self, df: pd.DataFrame | None = None, max_versions: int = 10):
+        self.max_versions = max_versions
+        self.reset(df)
+
+    def reset(self, df: pd.DataFrame | None) -> None:
+        """Replace the dataframe and clear the operations and history"""
+        self.df = df
+        self.operations: List[Dict] = []
+        self.profile: Dict | None = None  # Cached profile_dataframe result, cleared on every modification
+        self.versions: List[Dict] = []
+        self.next_version = 0
+        if df is not None:
+            self.commit("Loaded data")
+
+    def commit(self, description: str) -> int:
+        """Store the current dataframe as a new version, discarding versions after a checkout"""
+        self.versions.append({
+            'version': self.next_version,
+            'df': self.df.copy(deep=False),
+            'n_operations': len(self.operations),
+            'description': description
+        })
+        self.next_version += 1
+        self.versions = self.versions[-self.max_versions:]
+        return self.versions[-1]['version']
+
+    def checkout(self, version: int) -> bool:
+        """Restore a version of the history, later versions are dropped on the next commit"""
+        for i, entry in enumerate(self.versions):
+            if entry['version'] == version:
+                self.df = entry['df'].copy(deep=False)
+                self.operations = self.operations[:entry['n_operations']]
+                self.profile = None
+                self.versions = self.versions[:i + 1]
+                self.next_version = version + 1
+                return True
+        return False
+
+    def history(self) -> List[str]:
+        return [f"{entry['version']}: {entry['description']}" for entry in self.versions]
+
+def get_dataframe_context(config: RunnableConfig) -> DataFrameContext | None:
+    """Get the dataframe context of the current invocation"""
+    return config.get("configurable", {}).get("dataframe_context")
+
+def get_dataframe(config: RunnableConfig) -> pd.DataFrame | None:
+    """Get the dataframe of the current invocation"""
+    context = get_dataframe_context(config)
+    return context.df if context is not None else None
+
+def record_operation(config: RunnableConfig, tool_name: str, commit: bool = True, **args) -> None:
+    """Record a modifying tool call on the dataframe context of the current invocation
+    and commit the resulting dataframe as a new version (unless commit is False)"""
+    context = get_dataframe_context(config)
+    if context is not None:
+        context.operations.append({"tool": tool_name, "args": args})
+        context.profile = None
+        if commit:
+            context.commit(f"{tool_name} {args}")
+
+
+def instrumented(func):
+    """Record latency, output size and the dataframe shape/memory before and after a tool call
+    in the run metrics of config["configurable"]["metrics"] (if set). Goes below @tool."""
+
+    @wraps(func)
+    def wrapper(config: RunnableConfig, *args, **kwargs):
+        metrics = config.get("configurable", {}).get("metrics")
+        if metrics is None:
+            return func(config, *args, **kwargs)
+
+        def df_stats() -> Dict:
+            df = get_dataframe(config)
+            if df is None:
+                return {"shape": None, "memory_bytes": None}
+            return {"shape": list(df.shape), "memory_bytes": int(df.memory_usage(deep=False).sum())}
+
+        before = df_stats()
+        start = time.perf_counter()
+        error = None
+        try:
+            result = func(config, *args, **kwargs)
+            return result
+        except Exception as e:
+            error, result = str(e), ""
+            raise
+        finally:
+            metrics.record("tool", {
+                "tool": func.__name__,
+                "latency_s": time.perf_counter() - start,
+                "output_chars": len(str(result)),
+                "shape_before": before["shape"],
+                "shape_after": df_stats()["shape"],
+                "memory_bytes_before": before["memory_bytes"],
+                "memory_bytes_after": df_stats()["memory_bytes"],
+                "error": error
+            })
+
+    return wrapper
 
 
 ## Functions ##
 
-def load_tabular_data(file_path: Union[str, Path]) -> pd.DataFrame:
+def decategorize(series: pd.Series) -> pd.Series:
+    """Return the values of a categorical series as objects so they can be parsed"""
+    return series.astype(object) if isinstance(series.dtype, pd.CategoricalDtype) else series
+
+CONVERSIONS = {
+    'datetime': lambda series: pd.to_datetime(decategorize(series), errors='coerce'),
+    'numeric': lambda series: pd.to_numeric(decategorize(series), errors='coerce'),
+    'category': lambda series: series.astype('category'),
+}
+
+MISSING_VALUE_STRATEGIES = ['drop', 'mean', 'median', 'mode', 'ffill', 'bfill']
+
+# Arguments recorded for each modifying tool (see record_operation)
+OPERATION_ARGS = {
+    'rename_columns': ['column_mapping'],
+    'drop_columns': ['columns'],
+    'remove_duplicates': ['subset'],
+    'convert_column_type': ['column', 'target_type'],
+    'handle_missing_values': ['column', 'strategy'],
+}
+
+def memory_usage_mb(df: pd.DataFrame) -> float:
+    """Deep memory usage of a DataFrame in MB"""
+    return df.memory_usage(deep=True).sum() / 1024**2
+
+def optimize_dtypes(df: pd.DataFrame, category_ratio: float = 0.5) -> pd.DataFrame:
+    """Reduce the memory of a DataFrame without changing its values.
+
+    Integers are downcast to the smallest integer type, floats to float32 when that is
+    lossless, and string columns with fewer than category_ratio unique values per row
+    become categories.
+    """
+    optimized = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        elif pd.api.types.is_integer_dtype(series):
+            optimized[column] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            downcast = series.astype('float32')
+            if ((downcast.astype(series.dtype) == series) | series.isna()).all():
+                optimized[column] = downcast
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if len(series) and series.nunique(dropna=True) < category_ratio * len(series):
+                optimized[column] = series.astype('category')
+    return df.assign(**optimized) if optimized else df
+
+def load_tabular_data(file_path: Union[str, Path], optimize: bool = True) -> pd.DataFrame:
 
     file_path = Path(file_path)
     suffix = file_path.suffix.lower()
     
     try:
         if suffix == '.csv':
-            return pd.read_csv(file_path)
+            df = pd.read_csv(file_path, engine='pyarrow')
         elif suffix == '.tsv':
-            return pd.read_csv(file_path, sep='\t')
+            df = pd.read_csv(file_path, sep='\t', engine='pyarrow')
         elif suffix in ['.xls', '.xlsx']:
-            return pd.read_excel(file_path)
+            df = pd.read_excel(file_path)
+        elif suffix == '.parquet':
+            df = pd.read_parquet(file_path)
+        elif suffix in ['.feather', '.arrow']:
+            df = pd.read_feather(file_path)
         else:
             raise ValueError(f"Unsupported file format: {suffix}")
     except Exception as e:
         raise Exception(f"Error loading file {file_path}: {str(e)}")
 
+    return optimize_dtypes(df) if optimize else df
+
+def to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """Convert a DataFrame to an Arrow table, storing mixed-type object columns as strings"""
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mixed_columns = [col for col in df.columns if df[col].dtype == object]
+        return pa.Table.from_pandas(
+            df.astype({col: 'string' for col in mixed_columns}),
+            preserve_index=False
+        )
+
+def write_schema_sidecar(file_path: Union[str, Path], dtypes: pd.Series, rows: int) -> None:
+    """Write the column dtypes of a cleaned file to <file_path>.schema.json"""
+    schema = {
+        'format': Path(file_path).suffix.lower()[1:],
+        'rows': rows,
+        'columns': [{'name': str(col), 'dtype': str(dtype)} for col, dtype in dtypes.items()]
+    }
+    with open(f"{file_path}.schema.json", 'w') as f:
+        json.dump(schema, f, indent=2)
+
+def save_tabular_data(df: pd.DataFrame, file_path: Union[str, Path]) -> None:
+    """Save a DataFrame in the format given by the file suffix (csv, parquet, feather/arrow) with a schema sidecar"""
+
+    file_path = Path(file_path)
+    suffix = file_path.suffix.lower()
+
+    if suffix == '.csv':
+        df.to_csv(file_path, index=False)
+    elif suffix == '.parquet':
+        pq.write_table(to_arrow_table(df), file_path, compression='zstd')
+    elif suffix in ['.feather', '.arrow']:
+        feather.write_feather(to_arrow_table(df), file_path, compression='zstd')
+    else:
+        raise ValueError(f"Unsupported output format: {suffix}")
+
+    write_schema_sidecar(file_path, df.dtypes, len(df))
+
+
+def profile_dataframe(df: pd.DataFrame, parse_sample: int = 1000) -> Dict:
+    """Profile every column of a DataFrame with vectorized pandas operations.
+
+    Args:
+        df: DataFrame to profile
+        parse_sample: Number of non-null values of text columns used to estimate numeric/datetime parse rates
+
+    Returns:
+        Dictionary with the shape, duplicate row count, memory usage and per column:
+        dtype, null count, cardinality, inferred semantic type, parse rates and top values
+    """
+    null_counts = df.isna().sum()
+    cardinality = df.nunique(dropna=True)
+    n_rows = len(df)
+
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        profile = {
+            'dtype': str(series.dtype),
+            'nulls': int(null_counts[column]),
+            'unique': int(cardinality[column]),
+        }
+
+        if pd.api.types.is_bool_dtype(series):
+            profile['semantic_type'] = 'boolean'
+        elif pd.api.types.is_numeric_dtype(series):
+            profile['semantic_type'] = 'numeric'
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            profile['semantic_type'] = 'datetime'
+        else:
+            # Estimate how much of a text column parses as numbers or dates
+            sample = series.dropna().astype(str).head(parse_sample)
+            numeric_rate = float(pd.to_numeric(sample, errors='coerce').notna().mean()) if len(sample) else 0.0
+            datetime_rate = float(pd.to_datetime(sample, errors='coerce', format='mixed').notna().mean()) if len(sample) else 0.0
+            profile['numeric_parse_rate'] = round(numeric_rate, 3)
+            profile['datetime_parse_rate'] = round(datetime_rate, 3)
+            if numeric_rate >= 0.9:
+                profile['semantic_type'] = 'numeric (stored as text)'
+            elif datetime_rate >= 0.9:
+                profile['semantic_type'] = 'datetime (stored as text)'
+            elif cardinality[column] <= max(20, 0.05 * n_rows):
+                profile['semantic_type'] = 'categorical'
+            else:
+                profile['semantic_type'] = 'text'
+
+        profile['top_values'] = {str(value): int(count) for value, count in series.value_counts().head(3).items()}
+        columns[str(column)] = profile
+
+    return {
+        'shape': {'rows': n_rows, 'columns': len(df.columns)},
+        'duplicate_rows': int(df.duplicated().sum()),
+        'memory_bytes': int(df.memory_usage(deep=True).sum()),
+        'columns': columns
+    }
+
+def get_profile(config: RunnableConfig) -> Dict | None:
+    """Profile the dataframe of the current invocation, reusing the cached profile if unmodified"""
+    context = get_dataframe_context(config)
+    if context is None or context.df is None:
+        return None
+    if context.profile is None:
+        context.profile = profile_dataframe(context.df)
+    return context.profile
+
 
 ## TOOLS ##
 
 @tool
-def table_head(n: int = 5) -> str:
+@instrumented
+def table_profile(config: RunnableConfig) -> str:
+    """Return a profile of every column of the current DataFrame.
+    
+    Returns:
+        JSON string containing the shape, duplicate row count, memory usage and per column:
+        dtype, null count, number of unique values, inferred semantic type, numeric/datetime
+        parse rates for text columns and the top values
+    """
+    profile = get_profile(config)
+    if profile is not None:
+        return json.dumps(profile)
+    else:
+        return "No DataFrame loaded in state"
+
+@tool
+@instrumented
+def table_head(config: RunnableConfig, n: int = 5) -> str:
     """Return the first n rows of the current DataFrame.
     
     Args:
@@ -52,15 +339,16 @@ def table_head(n: int = 5) -> str:
         JSON string containing the first n rows of the DataFrame
     """
 
-    global current_dataframe
+    current_dataframe = get_dataframe(config)
     
     if current_dataframe is not None:
-        return current_dataframe.head(n).to_json(orient='records', indent=2)
+        return current_dataframe.head(n).to_json(orient='records')
     else:
         return "No DataFrame loaded in state"
 
 @tool
-def table_tail(n: int = 5) -> str:
+@instrumented
+def table_tail(config: RunnableConfig, n: int = 5) -> str:
     """Return the last n rows of the current DataFrame.
     
     Args:
@@ -69,14 +357,15 @@ def table_tail(n: int = 5) -> str:
     Returns:
         JSON string containing the last n rows of the DataFrame
     """
-    global current_dataframe
+    current_dataframe = get_dataframe(config)
     if current_dataframe is not None:
-        return current_dataframe.tail(n).to_json(orient='records', indent=2)
+        return current_dataframe.tail(n).to_json(orient='records')
     else:
         return "No DataFrame loaded in state"
 
 @tool
-def table_info() -> str:
+@instrumented
+def table_info(config: RunnableConfig) -> str:
     """Return information about the current DataFrame.
     
     Returns:
@@ -86,7 +375,7 @@ def table_info() -> str:
         - shape: Dictionary of number of rows and columns
         - null_counts: Dictionary of column names and their null counts
     """
-    global current_dataframe
+    current_dataframe = get_dataframe(config)
     if current_dataframe is not None:
         info_dict = {
             'dtypes': current_dataframe.dtypes.astype(str).to_dict(),
@@ -94,25 +383,27 @@ def table_info() -> str:
             'shape': {'rows': len(current_dataframe), 'columns': len(current_dataframe.columns)},
             'null_counts': current_dataframe.isnull().sum().to_dict()
         }
-        return json.dumps(info_dict, indent=2)
+        return json.dumps(info_dict)
     else:
         return "No DataFrame loaded in state"
 
 @tool
-def table_describe() -> str:
+@instrumented
+def table_describe(config: RunnableConfig) -> str:
     """Return a statistical description of the current DataFrame.
     
     Returns:
         JSON string containing statistical description of the DataFrame by using pandas describe()
     """
-    global current_dataframe
+    current_dataframe = get_dataframe(config)
     if current_dataframe is not None:
-        return current_dataframe.describe().to_json(orient='index', indent=2)
+        return current_dataframe.describe().to_json(orient='index')
     else:
         return "No DataFrame loaded in state"
 
 @tool
-def rename_columns(column_mapping: Dict[str, str]) -> str:
+@instrumented
+def rename_columns(config: RunnableConfig, column_mapping: Dict[str, str]) -> str:
     """Rename columns in the current DataFrame (inplace).
     
     Args:
@@ -121,15 +412,17 @@ def rename_columns(column_mapping: Dict[str, str]) -> str:
     Returns:
         Status message (the updated DataFrame is stored in the state variable)
     """
-    global current_dataframe
+    current_dataframe = get_dataframe(config)
     if current_dataframe is not None:
         current_dataframe.rename(columns=column_mapping, inplace=True)
+        record_operation(config, "rename_columns", column_mapping=column_mapping)
         return f"Renamed columns: {column_mapping}"
     else:
         return "No DataFrame loaded in state"
 
 @tool
-def drop_columns(columns: List[str]) -> str:
+@instrumented
+def drop_columns(config: RunnableConfig, columns: List[str]) -> str:
     """Drop specified columns from the current DataFrame (inplace).
     
     Args:
@@ -138,11 +431,12 @@ def drop_columns(columns: List[str]) -> str:
     Returns:
         Status message (the updated DataFrame is stored in the state variable)
     """
-    global current_dataframe
+    current_dataframe = get_dataframe(config)
     if current_dataframe is not None:
         valid_columns = [col for col in columns if col in current_dataframe.columns]
         if valid_columns:
             current_dataframe.drop(columns=valid_columns, errors='ignore', inplace=True)
+            record_operation(config, "drop_columns", columns=valid_columns)
             return f"Dropped columns: {valid_columns}"
         else:
             return "No valid columns to drop"
@@ -150,7 +444,8 @@ def drop_columns(columns: List[str]) -> str:
         return "No DataFrame loaded in state"
 
 @tool
-def remove_duplicates(subset: Optional[List[str]] = None) -> str:
+@instrumented
+def remove_duplicates(config: RunnableConfig, subset: Optional[List[str]] = None) -> str:
     """Remove duplicate rows from the current DataFrame.
     
     Args:
@@ -160,17 +455,19 @@ def remove_duplicates(subset: Optional[List[str]] = None) -> str:
     Returns:
         Status message (the updated DataFrame is stored in the state variable)
     """
-    global current_dataframe
+    current_dataframe = get_dataframe(config)
     if current_dataframe is not None:
         initial_count = len(current_dataframe)
         current_dataframe.drop_duplicates(subset=subset, inplace=True)
+        record_operation(config, "remove_duplicates", subset=subset)
         removed_count = initial_count - len(current_dataframe)
         return f"Removed {removed_count} duplicate rows"
     else:
         return "No DataFrame loaded in state"
 
 @tool
-def convert_column_type(column: str, target_type: str) -> str:
+@instrumented
+def convert_column_type(config: RunnableConfig, column: str, target_type: str) -> str:
     """Convert a column to a specified data type in the current DataFrame.
     
     Args:
@@ -180,23 +477,20 @@ def convert_column_type(column: str, target_type: str) -> str:
     Returns:
         Status message (the updated DataFrame is stored in the state variable)
     """
-    global current_dataframe
+    current_dataframe = get_dataframe(config)
     if current_dataframe is not None:
         if column not in current_dataframe.columns:
             return f"Column '{column}' not found in DataFrame"
             
         try:
             original_dtype = str(current_dataframe[column].dtype)
-            if target_type == 'datetime':
-                current_dataframe[column] = pd.to_datetime(current_dataframe[column], errors='coerce')
-            elif target_type == 'numeric':
-                current_dataframe[column] = pd.to_numeric(current_dataframe[column], errors='coerce')
-            elif target_type == 'category':
-                current_dataframe[column] = current_dataframe[column].astype('category')
+            if target_type in CONVERSIONS:
+                current_dataframe[column] = CONVERSIONS[target_type](current_dataframe[column])
             else:
                 return f"Unsupported target type: {target_type}"
             
             new_dtype = str(current_dataframe[column].dtype)
+            record_operation(config, "convert_column_type", column=column, target_type=target_type)
             return f"Converted column '{column}' from {original_dtype} to {new_dtype}"
         except Exception as e:
             return f"Failed to convert column '{column}' to {target_type}: {str(e)}"
@@ -204,7 +498,8 @@ def convert_column_type(column: str, target_type: str) -> str:
         return "No DataFrame loaded in state"
 
 @tool
-def handle_missing_values(column: str, strategy: str) -> str:
+@instrumented
+def handle_missing_values(config: RunnableConfig, column: str, strategy: str) -> str:
     """Handle missing values in a column of the current DataFrame.
     
     Args:
@@ -220,48 +515,51 @@ def handle_missing_values(column: str, strategy: str) -> str:
     Returns:
         Status message (the updated DataFrame is stored in the state variable)
     """
-    global current_dataframe
+    current_dataframe = get_dataframe(config)
     if current_dataframe is not None:
         if column not in current_dataframe.columns:
             return f"Column '{column}' not found in DataFrame"
     
     initial_missing = current_dataframe[column].isna().sum()
     if initial_missing == 0:
+        # Recorded even if the sample has no missing values since the full file might
+        if strategy in MISSING_VALUE_STRATEGIES:
+            record_operation(config, "handle_missing_values", column=column, strategy=strategy)
         return f"No missing values found in column '{column}'"
     
     try:
         if strategy == 'drop':
             current_dataframe.dropna(subset=[column], inplace=True)
-            return f"Dropped {initial_missing} rows with missing values in column '{column}'"
+            message = f"Dropped {initial_missing} rows with missing values in column '{column}'"
             
         elif strategy == 'mean' and pd.api.types.is_numeric_dtype(current_dataframe[column]):
             fill_value = current_dataframe[column].mean()
             current_dataframe[column] = current_dataframe[column].fillna(fill_value)
-            return f"Filled {initial_missing} missing values in column '{column}' with mean: {fill_value:.2f}"
+            message = f"Filled {initial_missing} missing values in column '{column}' with mean: {fill_value:.2f}"
             
         elif strategy == 'median' and pd.api.types.is_numeric_dtype(current_dataframe[column]):
             fill_value = current_dataframe[column].median()
             current_dataframe[column] = current_dataframe[column].fillna(fill_value)
-            return f"Filled {initial_missing} missing values in column '{column}' with median: {fill_value:.2f}"
+            message = f"Filled {initial_missing} missing values in column '{column}' with median: {fill_value:.2f}"
             
         elif strategy == 'mode':
             mode_values = current_dataframe[column].mode()
             if not mode_values.empty:
                 fill_value = mode_values[0]
                 current_dataframe[column] = current_dataframe[column].fillna(fill_value)
-                return f"Filled {initial_missing} missing values in column '{column}' with mode: {fill_value}"
+                message = f"Filled {initial_missing} missing values in column '{column}' with mode: {fill_value}"
             else:
                 return f"No mode available for column '{column}'. No changes made."
                 
         elif strategy == 'ffill':
-            current_dataframe[column] = current_dataframe[column].fillna(method='ffill')
+            current_dataframe[column] = current_dataframe[column].ffill()
             filled = initial_missing - current_dataframe[column].isna().sum()
-            return f"Forward filled {filled} missing values in column '{column}'"
+            message = f"Forward filled {filled} missing values in column '{column}'"
             
         elif strategy == 'bfill':
-            current_dataframe[column] = current_dataframe[column].fillna(method='bfill')
+            current_dataframe[column] = current_dataframe[column].bfill()
             filled = initial_missing - current_dataframe[column].isna().sum()
-            return f"Backward filled {filled} missing values in column '{column}'"
+            message = f"Backward filled {filled} missing values in column '{column}'"
             
         else:
             return f"Invalid strategy '{strategy}' for column '{column}'. No changes made."
@@ -269,6 +567,226 @@ def handle_missing_values(column: str, strategy: str) -> str:
     except Exception as e:
         return f"Error handling missing values in column '{column}': {str(e)}"
 
+    record_operation(config, "handle_missing_values", column=column, strategy=strategy)
+    return message
+
+class CleaningOperation(BaseModel):
+    operation: Literal['rename_columns', 'drop_columns', 'remove_duplicates', 'convert_column_type', 'handle_missing_values'] = Field(
+        description="Name of the cleaning tool to apply"
+    )
+    column_mapping: Optional[Dict[str, str]] = Field(default=None, description="rename_columns: old name to new name")
+    columns: Optional[List[str]] = Field(default=None, description="drop_columns: columns to drop")
+    subset: Optional[List[str]] = Field(default=None, description="remove_duplicates: columns to consider, all if None")
+    column: Optional[str] = Field(default=None, description="convert_column_type/handle_missing_values: column to process")
+    target_type: Optional[str] = Field(default=None, description="convert_column_type: 'numeric', 'datetime' or 'category'")
+    strategy: Optional[str] = Field(default=None, description="handle_missing_values: 'drop', 'mean', 'median', 'mode', 'ffill' or 'bfill'")
+
+def validate_cleaning_plan(df: pd.DataFrame, operations: List[CleaningOperation]) -> List[str]:
+    """Check a plan against the DataFrame schema, following renames, drops and conversions.
+
+    Returns:
+        List of error messages, empty if the plan is valid
+    """
+    columns = list(df.columns)
+    numeric = {col for col in columns if pd.api.types.is_numeric_dtype(df[col])}
+    errors = []
+
+    for i, op in enumerate(operations, start=1):
+        if op.operation == 'rename_columns':
+            if not op.column_mapping:
+                errors.append(f"{i}. rename_columns: column_mapping is required")
+                continue
+            missing = [col for col in op.column_mapping if col not in columns]
+            if missing:
+                errors.append(f"{i}. rename_columns: columns not found {missing}")
+            columns = [op.column_mapping.get(col, col) for col in columns]
+            numeric = {op.column_mapping.get(col, col) for col in numeric}
+
+        elif op.operation == 'drop_columns':
+            if not op.columns or not any(col in columns for col in op.columns):
+                errors.append(f"{i}. drop_columns: no valid columns to drop in {op.columns}")
+                continue
+            columns = [col for col in columns if col not in op.columns]
+
+        elif op.operation == 'remove_duplicates':
+            missing = [col for col in op.subset or [] if col not in columns]
+            if missing:
+                errors.append(f"{i}. remove_duplicates: columns not found {missing}")
+
+        elif op.column not in columns:
+            errors.append(f"{i}. {op.operation}: column '{op.column}' not found")
+
+        elif op.operation == 'convert_column_type':
+            if op.target_type not in CONVERSIONS:
+                errors.append(f"{i}. convert_column_type: unsupported target type '{op.target_type}'")
+            elif op.target_type == 'numeric':
+                numeric.add(op.column)
+            else:
+                numeric.discard(op.column)
+
+        elif op.strategy not in MISSING_VALUE_STRATEGIES:
+            errors.append(f"{i}. handle_missing_values: invalid strategy '{op.strategy}'")
+
+        elif op.strategy in ['mean', 'median'] and op.column not in numeric:
+            errors.append(f"{i}. handle_missing_values: strategy '{op.strategy}' requires a numeric column, '{op.column}' is not")
+
+    return errors
+
+def group_operations(operations: List[CleaningOperation]) -> List[List[CleaningOperation]]:
+    """Group consecutive operations that can be executed together.
+
+    Conversions to the same target type, fills (mean/median/mode/ffill/bfill) and drops of
+    missing values are grouped as long as each column appears once in the group, so the
+    result is the same as applying the operations one by one.
+    """
+    def kind(op: CleaningOperation) -> Optional[str]:
+        if op.operation == 'convert_column_type':
+            return f"convert:{op.target_type}"
+        if op.operation == 'handle_missing_values':
+            return 'drop' if op.strategy == 'drop' else 'fill'
+        return None
+
+    groups = []
+    for op in operations:
+        if groups and kind(op) is not None and kind(op) == kind(groups[-1][0]) and op.column not in {g.column for g in groups[-1]}:
+            groups[-1].append(op)
+        else:
+            groups.append([op])
+    return groups
+
+@tool
+@instrumented
+def apply_cleaning_plan(config: RunnableConfig, operations: List[CleaningOperation]) -> str:
+    """Apply an ordered list of cleaning operations to the current DataFrame in one call.
+    
+    Prefer this tool over calling rename_columns, drop_columns, remove_duplicates,
+    convert_column_type and handle_missing_values one at a time. The whole plan is validated
+    against the schema first (following renames and drops) and nothing is applied if any
+    operation is invalid. Consecutive conversions and missing value fills are executed together.
+    
+    Args:
+        operations: Ordered list of operations, each with the arguments of the corresponding tool
+        
+    Returns:
+        Compact report with one line per operation (the updated DataFrame is stored in the state variable)
+    """
+    context = get_dataframe_context(config)
+    if context is None or context.df is None:
+        return "No DataFrame loaded in state"
+
+    df = context.df
+    errors = validate_cleaning_plan(df, operations)
+    if errors:
+        return "Plan not applied, fix these operations:\n" + "\n".join(errors)
+
+    report, recorded = [], []
+    for group in group_operations(operations):
+        op = group[0]
+
+        if op.operation == 'rename_columns':
+            df = df.rename(columns=op.column_mapping)
+            report.append(f"rename_columns: {op.column_mapping}")
+
+        elif op.operation == 'drop_columns':
+            valid_columns = [col for col in op.columns if col in df.columns]
+            df = df.drop(columns=valid_columns)
+            report.append(f"drop_columns: {valid_columns}")
+            recorded.append(("drop_columns", {"columns": valid_columns}))
+            continue
+
+        elif op.operation == 'remove_duplicates':
+            initial_count = len(df)
+            df = df.drop_duplicates(subset=op.subset)
+            report.append(f"remove_duplicates: removed {initial_count - len(df)} rows")
+
+        elif op.operation == 'convert_column_type':
+            columns = [g.column for g in group]
+            original_dtypes = df[columns].dtypes.astype(str)
+            df = df.assign(**{col: CONVERSIONS[op.target_type](df[col]) for col in columns})
+            report += [
+                f"convert_column_type: '{col}' {original_dtypes[col]} -> {df[col].dtype}" for col in columns
+            ]
+
+        elif op.strategy == 'drop':
+            columns = [g.column for g in group]
+            initial_count = len(df)
+            df = df.dropna(subset=columns)
+            report.append(f"handle_missing_values drop: removed {initial_count - len(df)} rows with missing values in {columns}")
+
+        else:
+            # Compute all fill values of the group together, then fill in one pass
+            initial_missing = df[[g.column for g in group]].isna().sum()
+            by_strategy = {strategy: [g.column for g in group if g.strategy == strategy] for strategy in MISSING_VALUE_STRATEGIES}
+            fill_values = {}
+            if by_strategy['mean']:
+                fill_values.update(df[by_strategy['mean']].mean().to_dict())
+            if by_strategy['median']:
+                fill_values.update(df[by_strategy['median']].median().to_dict())
+            if by_strategy['mode']:
+                modes = df[by_strategy['mode']].mode()
+                if not modes.empty:
+                    fill_values.update(modes.iloc[0].dropna().to_dict())
+            df = df.fillna(value=fill_values)
+            if by_strategy['ffill']:
+                df[by_strategy['ffill']] = df[by_strategy['ffill']].ffill()
+            if by_strategy['bfill']:
+                df[by_strategy['bfill']] = df[by_strategy['bfill']].bfill()
+            remaining_missing = df[[g.column for g in group]].isna().sum()
+            report += [
+                f"handle_missing_values {g.strategy}: filled {int(initial_missing[g.column] - remaining_missing[g.column])} values in '{g.column}'"
+                for g in group
+            ]
+
+        recorded += [
+            (g.operation, {key: getattr(g, key) for key in OPERATION_ARGS[g.operation]})
+            for g in group
+        ]
+
+    # Only a fully applied plan is stored and recorded (as single tool equivalents for replay)
+    context.df = df
+    for operation, args in recorded:
+        record_operation(config, operation, commit=False, **args)
+    context.commit(f"apply_cleaning_plan with {len(recorded)} operations")
+    return "\n".join(report)
+
+@tool
+@instrumented
+def undo(config: RunnableConfig, steps: int = 1) -> str:
+    """Undo the last modifying tool calls on the current DataFrame.
+    
+    Args:
+        steps: Number of modifying tool calls to undo (default: 1)
+        
+    Returns:
+        Status message with the remaining version history
+    """
+    context = get_dataframe_context(config)
+    if context is None or context.df is None:
+        return "No DataFrame loaded in state"
+    if steps < 1 or steps >= len(context.versions):
+        return f"Can undo between 1 and {len(context.versions) - 1} steps. History:\n" + "\n".join(context.history())
+    context.checkout(context.versions[-1 - steps]['version'])
+    return f"Undid {steps} step(s). History:\n" + "\n".join(context.history())
+
+@tool
+@instrumented
+def checkout(config: RunnableConfig, version: int) -> str:
+    """Restore the current DataFrame to an earlier version.
+    
+    Args:
+        version: Version number from the history returned by undo or checkout
+            (version 0 is the loaded data while it is still in the bounded history)
+        
+    Returns:
+        Status message with the version history
+    """
+    context = get_dataframe_context(config)
+    if context is None or context.df is None:
+        return "No DataFrame loaded in state"
+    if not context.checkout(version):
+        return f"Version {version} not found. History:\n" + "\n".join(context.history())
+    return f"Checked out version {version}. History:\n" + "\n".join(context.history())
+
 def get_dataframe_tools():
     return [
         rename_columns,
@@ -279,5 +797,21 @@ def get_dataframe_tools():
         table_head,
         table_tail,
         table_info,
-        table_describe
-    ]
\ No newline at end of file
+        table_describe,
+        table_profile,
+        apply_cleaning_plan,
+        undo,
+        checkout
+    ]
+
+def replay_operations(operations: List[Dict], config: RunnableConfig) -> bool:
+    """Replay recorded operations through the tools on the dataframe context of config.
+
+    Returns:
+        bool: Whether every operation applied successfully (and was recorded again)
+    """
+    tools = {t.name: t for t in get_dataframe_tools()}
+    context = get_dataframe_context(config)
+    for operation in operations:
+        tools[operation["tool"]].invoke(operation["args"], config=config)
+    return context.operations == operations
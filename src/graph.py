@@ -1,26 +1,149 @@
+import os
+import time
+import sqlite3
+import threading
+import constants
 from state import AgentState
+from typing import Iterator
 from langgraph.graph import StateGraph
 from langgraph.prebuilt import ToolNode
-from index_agent import index_agent
-from data_clean_agent import data_clean_agent
+from agents import shared
+from utils import list_data_files
+from run_progress import reset_progress, RunCancelled
+from metrics import instrument_node, drop_metrics
+from index_agent import index_documents_agent, finalize_index_agent
+from data_clean_agent import clean_and_index_agent
 from langgraph.graph.graph import CompiledGraph
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.sqlite import SqliteSaver
 
 
-def create_graph() -> CompiledGraph:
+def get_checkpointer(memory_path: str) -> SqliteSaver:
+    """SQLite checkpointer stored in the run directory"""
+    connection = sqlite3.connect(os.path.join(memory_path, constants.CHECKPOINT_FILE_NAME), check_same_thread=False)
+    return SqliteSaver(connection)
+
+
+def close_checkpointer(app: CompiledGraph) -> None:
+    """Close the SQLite connection of a graph bound by `with_checkpointer` once its run is finished"""
+    if isinstance(app.checkpointer, SqliteSaver):
+        app.checkpointer.conn.close()
+
+
+def dispatch_files(state: AgentState) -> dict:
+    """Split the files of the run into tabular files (cleaned, then indexed) and documents (only indexed)."""
+    file_paths = list_data_files(state["memory_path"])
+    tabular_files = [file for file in file_paths if file.split(".")[-1] in constants.TABULAR_FORMATS]
+    document_files = [file for file in file_paths if file not in tabular_files]
+
+    if state["debug"]:
+        print(f"Dispatching {len(tabular_files)} tabular files and {len(document_files)} documents")
+
+    return {"tabular_files": tabular_files, "document_files": document_files}
+
+
+def create_graph(checkpointer: BaseCheckpointSaver | None = None) -> CompiledGraph:
 
     # Connstruct Graph
     graph = StateGraph(AgentState)
 
-    # Add Nodes
-    graph.add_node("agent_clean", data_clean_agent)
-    graph.add_node("index_agent", index_agent)
+    # Add Nodes, each records its latency and exports the run metrics when it finishes
+    graph.add_node("dispatch", instrument_node("dispatch", dispatch_files))
+    graph.add_node("agent_clean", instrument_node("agent_clean", clean_and_index_agent))
+    graph.add_node("index_documents", instrument_node("index_documents", index_documents_agent))
+    graph.add_node("index_agent", instrument_node("index_agent", finalize_index_agent))
 
-    # Add Edges
-    graph.set_entry_point("agent_clean")
-    graph.add_edge("agent_clean", "index_agent")
+    # Add Edges: documents are indexed while the tabular files are cleaned (and indexed one by one),
+    # the index is finalized once both branches are done
+    graph.set_entry_point("dispatch")
+    graph.add_edge("dispatch", "agent_clean")
+    graph.add_edge("dispatch", "index_documents")
+    graph.add_edge(["agent_clean", "index_documents"], "index_agent")
     graph.set_finish_point("index_agent")
 
     # Compile Graph
-    app = graph.compile()
+    app = graph.compile(checkpointer=checkpointer)
 
     return app
+
+
+@shared
+def get_graph() -> CompiledGraph:
+    """Graph compiled once per process, see `with_checkpointer` to bind it to a run"""
+    return create_graph()
+
+
+def with_checkpointer(app: CompiledGraph, checkpointer: BaseCheckpointSaver | None) -> CompiledGraph:
+    """Copy of a compiled graph using another checkpointer, without recompiling it"""
+    return app.copy(update={"checkpointer": checkpointer})
+
+
+def run_graph(app: CompiledGraph, state: AgentState) -> AgentState:
+    """Invoke a checkpointed graph for the session uuid, resuming an interrupted run.
+
+    If the last checkpoint of the thread still has nodes to run the graph continues from
+    there, otherwise a new run starts. Finished files are skipped through the run manifest.
+    """
+    config = {"configurable": {"thread_id": str(state["uuid"])}}
+    return app.invoke(graph_input(app, state, config), config)
+
+
+def graph_input(app: CompiledGraph, state: AgentState, config: dict) -> AgentState | None:
+    """None to resume the unfinished checkpoint of the thread, else the state to start a new run"""
+    if app.checkpointer is not None and app.get_state(config).next:
+        return None
+    return state
+
+
+def stream_graph(app: CompiledGraph, state: AgentState) -> Iterator[tuple[str, dict]]:
+    """Like `run_graph`, but yields ("updates", {node: update}) after every node and
+    ("values", state) after every step, the last values are the output state."""
+    config = {"configurable": {"thread_id": str(state["uuid"])}}
+    yield from app.stream(graph_input(app, state, config), config, stream_mode=["updates", "values"])
+
+
+class BackgroundRun:
+    """Runs a graph in a daemon thread so the caller (the Streamlit script) is not blocked.
+
+    Finished nodes are reported to the run progress next to the per-file events of the
+    nodes. `cancel` stops the run between files, it can be resumed by running it again.
+    """
+
+    def __init__(self, app: CompiledGraph, state: AgentState):
+        self.progress = reset_progress(state["uuid"])
+        self.output: AgentState | None = None
+        self.error: Exception | None = None
+        self.cancelled = False
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+        self.thread = threading.Thread(target=self._run, args=(app, state), daemon=True)
+        self.thread.start()
+
+    def _run(self, app: CompiledGraph, state: AgentState) -> None:
+        try:
+            for mode, chunk in stream_graph(app, state):
+                if mode == "updates":
+                    for node, update in chunk.items():
+                        self.progress.report("node", node, "done", keys=sorted(update or {}))
+                else:
+                    self.output = chunk
+        except RunCancelled:
+            self.cancelled = True
+        except Exception as e:
+            print(f"Error running graph: {str(e)}")
+            self.error = e
+        finally:
+            close_checkpointer(app)
+            drop_metrics(state["uuid"])
+            self.finished_at = time.perf_counter()
+
+    @property
+    def done(self) -> bool:
+        return not self.thread.is_alive()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def cancel(self) -> None:
+        self.progress.cancel()
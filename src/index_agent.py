@@ -1,71 +1,285 @@
 import os
+import time
 import constants
 from tqdm import tqdm
 from state import AgentState
-from utils import load_file_context
-from agents import indexing_llm, FileContext
+from utils import load_file_context, column_summaries, list_data_files
+from agents import FileContext
+from datetime import datetime
+from index_cache import FileContextCache, hash_file
+from index_store import IndexStore, IndexRecord
+from run_manifest import RunManifest
+from metrics import get_metrics
+from run_progress import get_progress
+from model_routing import LOCAL, HOSTED, DEFAULT, route_document, escalated_route, indexing_llm, cache_model_name, record_route
+from vector_index import VectorIndex, get_embedder
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain_core.messages import (
     SystemMessage,
     HumanMessage,
 )
 
 
-def index_agent(state: AgentState) -> AgentState:
+def embed_records(records: list[IndexRecord], index_dir: str, embedder_name: str) -> int:
+    """Embed the description/structure of each indexed file and the column summaries of
+    tabular files into the vector index, skipping files whose content hash is unchanged.
 
-    if state["debug"]:
-        print(f"Entered index_agent")
+    Returns:
+        int: Number of vectors added
+    """
+    embedder = get_embedder(embedder_name)
+    vector_index = VectorIndex(index_dir, embedder.dim)
+
+    ids, texts, versions = [], [], []
+    for record in records:
+        if record.error is not None or (record.content_hash and vector_index.version(record.file_path) == record.content_hash):
+            continue
+
+        ids.append(record.file_path)
+        texts.append(f"{record.file_name}\n{record.description}\n{record.structure}\n{record.metadata}")
+        versions.append(record.content_hash)
+
+        try:
+            summaries = column_summaries(record.file_path)
+        except Exception as e:
+            print(f"Error summarizing columns of {record.file_path}: {str(e)}")
+            summaries = {}
+        for column, summary in summaries.items():
+            ids.append(f"{record.file_path}#{column}")
+            texts.append(summary)
+            versions.append(record.content_hash)
+
+    if ids:
+        vector_index.add(ids, embedder.embed(texts), versions)
+    return len(ids)
+
+
+def make_record(file_path: str, content_hash: str, response: FileContext | Exception) -> IndexRecord:
+    """Build the index record of a file from the indexing LLM response"""
+    try:
+        file_stats = os.stat(file_path)
+        size, modified_at = file_stats.st_size, datetime.fromtimestamp(file_stats.st_mtime).isoformat()
+    except OSError:
+        size, modified_at = 0, ""
+
+    record = IndexRecord(
+        file_name=os.path.basename(file_path),
+        file_type=os.path.splitext(file_path)[1],
+        file_path=file_path,
+        content_hash=content_hash,
+        size=size,
+        modified_at=modified_at
+    )
+
+    # A failing file is recorded in the index instead of aborting the batch
+    if isinstance(response, Exception):
+        print(f"Error indexing {file_path}: {str(response)}")
+        record.error = str(response)
+    else:
+        record.description = response.description
+        record.structure = response.structure
+        record.metadata = response.metadata
+
+    return record
+
+
+def index_files(file_paths: list[str], state: AgentState) -> list[IndexRecord]:
+    """Describe files with the indexing LLM and upsert their records into the index store.
+
+    Files completed in the run manifest with the same content are skipped and cached
+    results are reused. Each record is stored as soon as it is available so an interrupted
+    run can resume. With model routing, small files are described by the local model first
+    and the ones it fails on are escalated to the hosted model.
+
+    Returns:
+        list[IndexRecord]: Records of the files that were (re)indexed
+
+    Raises:
+        RunCancelled: If the run was cancelled before the files were sent to the LLM
+    """
+    progress = get_progress(state.get("uuid"))
+    cache = FileContextCache(
+        constants.INDEX_CACHE_DIR,
+        model_name=cache_model_name("indexing"),
+        prompt=constants.INDEX_AGENT_SYSTEM_PROMPT,
+        max_bytes=constants.INDEX_CACHE_MAX_BYTES
+    )
+    manifest = RunManifest(os.path.join(state["memory_path"], constants.RUN_MANIFEST_FILE_NAME))
+    store = IndexStore(os.path.join(state["memory_path"], "output", constants.INDEX_STORE_FILE_NAME))
+
+    records = []
+
+    def complete(file_path: str, content_hash: str, response: FileContext | Exception) -> None:
+        """Store the result of a file as soon as it is available so an interrupted run can resume"""
+        record = make_record(file_path, content_hash, response)
+        records.append(record)
+        try:
+            store.upsert(record)
+            # Failed files are retried when the run is resumed
+            if record.error is None and content_hash:
+                manifest.mark_done("index", file_path, content_hash)
+        except Exception as e:
+            # Reported as a failed file, so it is retried instead of silently missing from the index
+            print(f"Error storing index record for {file_path}: {str(e)}")
+            record.error = record.error or f"Error storing index record: {str(e)}"
+        if record.error is None:
+            progress.report("index", file_path, "done", description=record.description)
+        else:
+            progress.report("index", file_path, "error", error=record.error)
+
+    try:
+        # Skip completed files, use cached results and build one prompt per uncached file
+        content_hashes, cache_keys = {}, {}
+        batch_indices, batch_messages, routes = [], {}, {}
+        for i, file_path in enumerate(tqdm(file_paths, desc="Loading files", disable=len(file_paths) < 2)):
+
+            progress.check_cancelled()
+            try:
+                content_hashes[i] = hash_file(file_path)
+                if manifest.is_done("index", file_path, content_hashes[i]) and store.get(file_path) is not None:
+                    progress.report("index", file_path, "skipped")
+                    continue
+                cache_keys[i] = cache.key(content_hashes[i])
+                cached = cache.get(cache_keys[i], FileContext)
+            except OSError:
+                cached = None
+            if cached is not None:
+                complete(file_path, content_hashes[i], cached)
+                continue
+
+            # Load in context and information about the file
+            file_content = load_file_context(file_path, max_chars=2000)
+            file_name = os.path.basename(file_path)
+
+            batch_indices.append(i)
+            batch_messages[i] = [
+                SystemMessage(content=constants.INDEX_AGENT_SYSTEM_PROMPT),
+                HumanMessage(content=f"Please index the content of the file: {file_name} with the following content:\n{file_content}")
+            ]
+            routes[i] = route_document(file_path)
+
+        if state["debug"]:
+            print(f"Indexing {len(batch_messages)} files with the LLM, {len(records)} from cache")
+
+        # Describe uncached files concurrently, each result is stored as soon as it completes.
+        # The local batch runs first so the files it fails on join the hosted batch
+        progress.check_cancelled()
+        metrics = get_metrics(state.get("uuid"))
+        for i in batch_indices:
+            progress.report("index", file_paths[i], "running")
+        for tier in [LOCAL, HOSTED, DEFAULT]:
+            indices = [i for i in batch_indices if routes[i][0] == tier]
+            if not indices:
+                continue
+            llm = indexing_llm(tier)
+
+            def describe(i: int) -> tuple[int, FileContext | Exception, float]:
+                """Describe one file, timed on its own for the routing record"""
+                start = time.perf_counter()
+                try:
+                    response = llm.invoke(batch_messages[i], config={"callbacks": [metrics.callback]})
+                except Exception as e:
+                    response = e
+                return i, response, time.perf_counter() - start
+
+            max_workers = state.get("index_concurrency", constants.INDEX_AGENT_MAX_CONCURRENCY)
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                futures = [executor.submit(describe, i) for i in indices]
+                for future in as_completed(futures):
+                    i, response, latency_s = future.result()
+                    error = str(response) if isinstance(response, Exception) else None
+                    if response is None:
+                        error = "No structured output"
+                        response = ValueError(error)
+                    record_route(metrics, "index", file_paths[i], tier, routes[i][1], latency_s, error)
+                    if error is not None and tier == LOCAL:
+                        routes[i] = escalated_route(error)
+                        metrics.record("retry", {"source": "escalation", "stage": "index", "file": file_paths[i], "reason": error})
+                        continue
+
+                    if not isinstance(response, Exception) and i in cache_keys:
+                        try:
+                            cache.put(cache_keys[i], response)
+                        except OSError as e:
+                            print(f"Error caching index result for {file_paths[i]}: {str(e)}")
+                    complete(file_paths[i], content_hashes.get(i, ""), response)
+    finally:
+        store.close()
 
-    # Load in data files from memory path
-    file_paths = []
-    data_path = os.path.join(state["memory_path"], "data")
-    for root, dirs, files_ in os.walk(data_path):
-        for file in files_:
-            file_paths.append(os.path.abspath(os.path.join(root, file)))
-    
     if state["debug"]:
-        print(f"Found {len(file_paths)} files for indexing")
+        print(f"Index cache: {cache.stats()}")
 
-    content = ""
-    for file_path in tqdm(file_paths):
-
-        # Load in context and information about the file
-        file_content = load_file_context(file_path)
-        if len(file_content) > 2000:
-            file_content = f"Head of file: {file_content[:1000]} \n Tail of file: {file_content[-1000:]}"
-        file_name = os.path.basename(file_path)
-        file_type = os.path.splitext(file_path)[1]
-        
-        messages = [
-            SystemMessage(content=constants.INDEX_AGENT_SYSTEM_PROMPT),
-            HumanMessage(content=f"Please index the content of the file: {file_name} with the following content:\n{file_content}")
-        ]
-
-        # Get the initial response
-        response: FileContext = indexing_llm.invoke(messages)
-
-        file_info = (
-            f"File name: {file_name}\n"
-            f"File type: {file_type}\n"
-            f"File path: {file_path}\n"
-            f"Description: {response.description}\n"
-            f"Structure: {response.structure}\n"
-            f"Metadata: {response.metadata}\n\n"
-        )
+    return records
 
-        content += file_info
 
-    # Write index to file
+def finalize_index(state: AgentState) -> None:
+    """Render index.txt from the index store and embed the indexed files for retrieval."""
+    output_path = os.path.join(state["memory_path"], "output")
+    store = IndexStore(os.path.join(output_path, constants.INDEX_STORE_FILE_NAME))
+
+    # Render index.txt from the structured index, ordered by file path
     try:
-        index_file_path = os.path.join(state["memory_path"], "output", "index.txt")
-        with open(index_file_path, "w") as f:
+        records = store.find()
+        content = store.render_text()
+        with open(os.path.join(output_path, "index.txt"), "w") as f:
             f.write(content)
     except Exception as e:
-        print(f"Error writing to {index_file_path}: {str(e)}")
+        records = []
+        print(f"Error writing index to {output_path}: {str(e)}")
+    finally:
+        store.close()
+
+    # Embed indexed files for retrieval, unchanged files are skipped by content hash
+    try:
+        n_vectors = embed_records(
+            records,
+            os.path.join(output_path, constants.VECTOR_INDEX_DIR_NAME),
+            constants.INDEX_EMBEDDER
+        )
+        if state["debug"]:
+            print(f"Added {n_vectors} vectors to the vector index")
+    except Exception as e:
+        print(f"Error embedding index: {str(e)}")
+
+
+def index_agent(state: AgentState) -> AgentState:
+
+    if state["debug"]:
+        print(f"Entered index_agent")
+
+    # Load in data files from memory path
+    file_paths = list_data_files(state["memory_path"])
+
+    if state["debug"]:
+        print(f"Found {len(file_paths)} files for indexing")
+
+    index_files(file_paths, state)
+    finalize_index(state)
 
     state["indexed"] = True
     return state
 
 
+def index_documents_agent(state: AgentState) -> dict:
+    """Graph branch indexing the non-tabular files, runs in parallel with cleaning."""
+
+    if state["debug"]:
+        print(f"Entered index_documents_agent with {len(state.get('document_files', []))} files")
+
+    index_files(state.get("document_files", []), state)
+    return {}
+
+
+def finalize_index_agent(state: AgentState) -> dict:
+    """Join node of the graph, runs once all files are indexed."""
+
+    if state["debug"]:
+        print(f"Entered finalize_index_agent")
+
+    finalize_index(state)
+    return {"indexed": True}
+
+
 if __name__ == "__main__":
 
 
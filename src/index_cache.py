@@ -0,0 +1,124 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, Union
+from pydantic import BaseModel
+
+
+def hash_file(file_path: Union[str, os.PathLike], chunk_size: int = 1 << 20) -> str:
+    """Return the sha256 hex digest of the file content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def evict_lru(cache_dir: Path, max_bytes: int) -> int:
+    """Remove the least recently used *.json entries of a cache directory until it fits in max_bytes.
+
+    Recency is tracked with the entry's modification time.
+
+    Returns:
+        int: Total size of the remaining entries
+    """
+    entries = []
+    for entry_path in cache_dir.glob("*.json"):
+        try:
+            stat = entry_path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries, key=lambda entry: entry[0]):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            entry_path.unlink()
+            total_bytes -= size
+        except OSError:
+            pass
+    return total_bytes
+
+
+class CacheDirectory:
+    """Writes the *.json entries of a cache directory and keeps it within max_bytes.
+
+    The total size is scanned once and then kept as a running total, the directory is only
+    scanned again (evict_lru) when the total exceeds max_bytes. Entries are written through
+    a unique tmp name, so processes sharing the directory never replace each other's
+    partial files.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes: Optional[int] = None
+
+    def write(self, key: str, text: str) -> None:
+        entry_path = self.cache_dir / f"{key}.json"
+        tmp_path = entry_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        try:
+            replaced_bytes = entry_path.stat().st_size
+        except OSError:
+            replaced_bytes = 0
+        os.replace(tmp_path, entry_path)
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = evict_lru(self.cache_dir, self.max_bytes)
+            else:
+                self.total_bytes += len(text.encode("utf-8")) - replaced_bytes
+                if self.total_bytes > self.max_bytes:
+                    self.total_bytes = evict_lru(self.cache_dir, self.max_bytes)
+
+
+class FileContextCache:
+    """Persistent content-addressed cache of indexing results.
+
+    Each entry is a JSON file named after the hash of the file content, the model name
+    and the system prompt, so changing any of them invalidates the entry. The cache is
+    bounded by total size on disk and evicts the least recently used entries first
+    (recency is tracked with the entry's modification time).
+    """
+
+    def __init__(self, cache_dir: Union[str, os.PathLike], model_name: str, prompt: str, max_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.directory = CacheDirectory(self.cache_dir, max_bytes)
+        self.version = hashlib.sha256(f"{model_name}\n{prompt}".encode("utf-8")).hexdigest()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, content_hash: str) -> str:
+        """Cache key for a file: content hash (see hash_file) combined with the model/prompt version."""
+        return hashlib.sha256(f"{content_hash}:{self.version}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str, model: type[BaseModel]) -> Optional[BaseModel]:
+        """Return the cached result for key or None, updating the hit/miss counters."""
+        entry_path = self.cache_dir / f"{key}.json"
+        try:
+            with open(entry_path, "r", encoding="utf-8") as f:
+                result = model.model_validate(json.load(f))
+            os.utime(entry_path)  # Mark as recently used
+            self.hits += 1
+            return result
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+    def put(self, key: str, result: BaseModel) -> None:
+        """Store a result and evict old entries if the cache exceeds max_bytes."""
+        self.directory.write(key, result.model_dump_json())
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit/miss counters for this cache instance."""
+        return {"hits": self.hits, "misses": self.misses}
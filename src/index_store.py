@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional, Union
+from pydantic import BaseModel, Field
+
+
+class IndexRecord(BaseModel):
+    file_name: str = Field(description="The name of the file")
+    file_type: str = Field(description="The extension of the file")
+    file_path: str = Field(description="Absolute path of the file, unique per record")
+    content_hash: str = Field(default="", description="sha256 of the file content")
+    size: int = Field(default=0, description="Size of the file in bytes")
+    description: str = ""
+    structure: str = ""
+    metadata: str = ""
+    error: Optional[str] = Field(default=None, description="Error message if the file could not be indexed")
+    modified_at: str = Field(default="", description="ISO 8601 modification time of the file")
+    indexed_at: str = Field(default="", description="ISO 8601 time of the last upsert")
+    created_at: str = Field(default="", description="ISO 8601 time of the first upsert")
+
+
+COLUMNS = list(IndexRecord.model_fields)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    file_path TEXT PRIMARY KEY,
+    {", ".join(f"{column} TEXT" for column in COLUMNS if column not in ["file_path", "size"])},
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_name ON files (file_name);
+CREATE INDEX IF NOT EXISTS files_type ON files (file_type);
+CREATE INDEX IF NOT EXISTS files_hash ON files (content_hash);
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5 (
+    file_name, description, structure, metadata, content='files', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts (rowid, file_name, description, structure, metadata)
+    VALUES (new.rowid, new.file_name, new.description, new.structure, new.metadata);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, file_name, description, structure, metadata)
+    VALUES ('delete', old.rowid, old.file_name, old.description, old.structure, old.metadata);
+END;
+CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, file_name, description, structure, metadata)
+    VALUES ('delete', old.rowid, old.file_name, old.description, old.structure, old.metadata);
+    INSERT INTO files_fts (rowid, file_name, description, structure, metadata)
+    VALUES (new.rowid, new.file_name, new.description, new.structure, new.metadata);
+END;
+"""
+
+
+class IndexStore:
+    """SQLite backed index with one record per file.
+
+    Records are upserted by file path, looked up by name/type through B-tree indices and
+    searched by keyword through an FTS5 table over the name, description, structure and
+    metadata. `render_text` produces the flat index.txt view. Several stores write to the
+    same file at once (the cleaning and document branches, queue workers), so writers wait
+    up to `timeout` seconds for the lock instead of failing with "database is locked".
+    """
+
+    def __init__(self, db_path: Union[str, os.PathLike], timeout: float = 30):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def upsert(self, records: Union[IndexRecord, Iterable[IndexRecord]]) -> None:
+        """Insert or update records by file path in a single transaction, keeping created_at."""
+        if isinstance(records, IndexRecord):
+            records = [records]
+
+        now = datetime.now().isoformat()
+        rows = []
+        for record in records:
+            row = record.model_dump()
+            row["indexed_at"] = row["indexed_at"] or now
+            row["created_at"] = row["created_at"] or row["indexed_at"]
+            rows.append(row)
+
+        updates = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS if column not in ["file_path", "created_at"])
+        query = (
+            f"INSERT INTO files ({', '.join(COLUMNS)}) VALUES ({', '.join(':' + column for column in COLUMNS)}) "
+            f"ON CONFLICT (file_path) DO UPDATE SET {updates}"
+        )
+        with self.lock, self.connection:
+            self.connection.executemany(query, rows)
+
+    def delete(self, file_path: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM files WHERE file_path = ?", (file_path,))
+
+    def get(self, file_path: str) -> Optional[IndexRecord]:
+        """Return the record of a file path, or None."""
+        records = self._select("WHERE file_path = ?", (file_path,))
+        return records[0] if records else None
+
+    def find(
+            self,
+            name: Optional[str] = None,
+            file_type: Optional[str] = None,
+            keyword: Optional[str] = None,
+            limit: Optional[int] = None
+        ) -> List[IndexRecord]:
+        """Look up records by exact file name, file type (e.g. ".csv") and/or full-text keyword.
+
+        Args:
+            name: Exact file name
+            file_type: File extension including the dot
+            keyword: FTS5 query matched against name, description, structure and metadata
+            limit: Maximum number of records to return
+
+        Returns:
+            List[IndexRecord]: Matching records ordered by file path
+        """
+        conditions, params = [], []
+        if name is not None:
+            conditions.append("file_name = ?")
+            params.append(name)
+        if file_type is not None:
+            conditions.append("file_type = ?")
+            params.append(file_type)
+        if keyword is not None:
+            conditions.append("rowid IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)")
+            params.append(keyword)
+
+        clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        clause += " ORDER BY file_path"
+        if limit is not None:
+            clause += " LIMIT ?"
+            params.append(limit)
+        return self._select(clause, tuple(params))
+
+    def render_text(self) -> str:
+        """Render all records in the flat index.txt format."""
+        content = []
+        for record in self.find():
+            lines = [
+                f"File name: {record.file_name}\n",
+                f"File type: {record.file_type}\n",
+                f"File path: {record.file_path}\n",
+            ]
+            if record.error is not None:
+                lines.append(f"Error: {record.error}\n\n")
+            else:
+                lines += [
+                    f"Description: {record.description}\n",
+                    f"Structure: {record.structure}\n",
+                    f"Metadata: {record.metadata}\n\n",
+                ]
+            content.append("".join(lines))
+        return "".join(content)
+
+    def _select(self, clause: str, params: tuple) -> List[IndexRecord]:
+        with self.lock:
+            rows = self.connection.execute(f"SELECT {', '.join(COLUMNS)} FROM files {clause}", params).fetchall()
+        return [IndexRecord(**dict(row)) for row in rows]
@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Optional, Union
+from utils import list_data_files
+from run_progress import RunProgress
+import constants
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (run_id, stage, file_path)
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, lease_expires_at);
+CREATE INDEX IF NOT EXISTS tasks_run ON tasks (run_id, status);
+"""
+
+# Task statuses, a run is finished once none of its tasks is pending or leased
+PENDING, LEASED, DONE, FAILED, CANCELLED = "pending", "leased", "done", "failed", "cancelled"
+
+
+class JobQueue:
+    """SQLite backed queue of pipeline runs, shared by worker processes through the runs directory.
+
+    A run is split into one task per file and stage, the same topology as the graph:
+    tabular files get a "clean" task whose completion enqueues their "index" task, other
+    files get an "index" task, and the "finalize" task (index.txt and vector index) can
+    only be claimed once every other task of the run is finished.
+
+    Workers claim a task with a lease and extend it while they work. A task whose lease
+    expired (crashed worker) can be claimed again until it reaches `max_attempts`. Claims
+    run in an immediate transaction so two workers never get the same task; the database
+    uses the default rollback journal so it can live on a directory shared by several hosts.
+    """
+
+    def __init__(self, db_path: Union[str, os.PathLike], max_attempts: int = constants.JOB_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock:
+            self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _transaction(self, query_fn):
+        """Run query_fn(connection) in an immediate (write locked) transaction"""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = query_fn(self.connection)
+                self.connection.execute("COMMIT")
+                return result
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _upsert_task(connection: sqlite3.Connection, run_id: str, stage: str, file_path: str) -> None:
+        connection.execute(
+            "INSERT INTO tasks (run_id, stage, file_path, status, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (run_id, stage, file_path) DO UPDATE SET "
+            "status = excluded.status, worker_id = NULL, lease_expires_at = NULL, attempts = 0, error = NULL, updated_at = excluded.updated_at",
+            (run_id, stage, file_path, PENDING, time.time())
+        )
+
+    def enqueue_run(self, state: dict) -> str:
+        """Enqueue the files in the data directory of a run, re-enqueueing a run resets its tasks.
+
+        Args:
+            state: Graph state of the run, its JSON serializable settings are passed to the workers
+
+        Returns:
+            str: The run id (the session uuid)
+        """
+        run_id = str(state["uuid"])
+        settings = {key: value for key, value in state.items() if key not in ["messages", "current_df", "uuid"]}
+        settings["uuid"] = run_id
+        settings["memory_path"] = os.path.abspath(state["memory_path"])
+        file_paths = list_data_files(settings["memory_path"])
+
+        def enqueue(connection: sqlite3.Connection) -> None:
+            connection.execute(
+                "INSERT INTO runs (run_id, state, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (run_id) DO UPDATE SET state = excluded.state",
+                (run_id, json.dumps(settings, default=str), time.time())
+            )
+            for file_path in file_paths:
+                stage = "clean" if file_path.split(".")[-1] in constants.TABULAR_FORMATS else "index"
+                self._upsert_task(connection, run_id, stage, file_path)
+            self._upsert_task(connection, run_id, "finalize", "")
+
+        self._transaction(enqueue)
+        return run_id
+
+    def claim(self, worker_id: str, lease_seconds: float = constants.JOB_LEASE_SECONDS) -> Optional[dict]:
+        """Lease the oldest claimable task to a worker.
+
+        Returns:
+            Optional[dict]: The task with the run's state under "state", None if there is nothing to do
+        """
+        def claim_task(connection: sqlite3.Connection) -> Optional[dict]:
+            now = time.time()
+
+            # Tasks of crashed workers that used up their attempts are failed
+            for expired in connection.execute(
+                "SELECT * FROM tasks WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+                (LEASED, now, self.max_attempts)
+            ).fetchall():
+                self._fail_task(connection, dict(expired), "Lease expired")
+            row = connection.execute(
+                "SELECT tasks.*, runs.state FROM tasks JOIN runs USING (run_id) "
+                "WHERE (tasks.status = ? OR (tasks.status = ? AND tasks.lease_expires_at < ?)) "
+                "AND (tasks.stage != 'finalize' OR NOT EXISTS ("
+                "    SELECT 1 FROM tasks AS other WHERE other.run_id = tasks.run_id "
+                "    AND other.stage != 'finalize' AND other.status IN (?, ?)"
+                ")) "
+                "ORDER BY tasks.task_id LIMIT 1",
+                (PENDING, LEASED, now, PENDING, LEASED)
+            ).fetchone()
+            if row is None:
+                return None
+
+            connection.execute(
+                "UPDATE tasks SET status = ?, worker_id = ?, lease_expires_at = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE task_id = ?",
+                (LEASED, worker_id, now + lease_seconds, now, row["task_id"])
+            )
+            task = dict(row)
+            task["state"] = json.loads(task["state"])
+            task["attempts"] += 1
+            return task
+
+        return self._transaction(claim_task)
+
+    def heartbeat(self, task_id: int, worker_id: str, lease_seconds: float = constants.JOB_LEASE_SECONDS) -> bool:
+        """Extend the lease of a task, False if the worker lost it (lease expired and claimed again)"""
+        def extend(connection: sqlite3.Connection) -> bool:
+            cursor = connection.execute(
+                "UPDATE tasks SET lease_expires_at = ?, updated_at = ? WHERE task_id = ? AND worker_id = ? AND status = ?",
+                (time.time() + lease_seconds, time.time(), task_id, worker_id, LEASED)
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(extend)
+
+    def complete(self, task: dict, worker_id: str) -> None:
+        """Mark a leased task as done, a cleaned file is enqueued for indexing"""
+        def finish(connection: sqlite3.Connection) -> None:
+            cursor = connection.execute(
+                "UPDATE tasks SET status = ?, lease_expires_at = NULL, error = NULL, updated_at = ? "
+                "WHERE task_id = ? AND worker_id = ? AND status = ?",
+                (DONE, time.time(), task["task_id"], worker_id, LEASED)
+            )
+            if cursor.rowcount == 1 and task["stage"] == "clean":
+                self._upsert_task(connection, task["run_id"], "index", task["file_path"])
+
+        self._transaction(finish)
+
+    def _fail_task(self, connection: sqlite3.Connection, task: dict, error: str) -> None:
+        """Mark a task as failed for good, a file that could not be cleaned is still indexed like in the graph"""
+        connection.execute(
+            "UPDATE tasks SET status = ?, worker_id = NULL, lease_expires_at = NULL, error = ?, updated_at = ? WHERE task_id = ?",
+            (FAILED, error, time.time(), task["task_id"])
+        )
+        if task["stage"] == "clean":
+            self._upsert_task(connection, task["run_id"], "index", task["file_path"])
+
+    def fail(self, task: dict, worker_id: str, error: str) -> None:
+        """Release a task after an error, it is retried until it used up its attempts."""
+        def release(connection: sqlite3.Connection) -> None:
+            leased = connection.execute(
+                "SELECT 1 FROM tasks WHERE task_id = ? AND worker_id = ? AND status = ?",
+                (task["task_id"], worker_id, LEASED)
+            ).fetchone()
+            if leased is None:
+                return
+            if task["attempts"] >= self.max_attempts:
+                self._fail_task(connection, task, error)
+            else:
+                connection.execute(
+                    "UPDATE tasks SET status = ?, worker_id = NULL, lease_expires_at = NULL, error = ?, updated_at = ? WHERE task_id = ?",
+                    (PENDING, error, time.time(), task["task_id"])
+                )
+
+        self._transaction(release)
+
+    def cancel_run(self, run_id: str) -> None:
+        """Cancel the pending tasks of a run, leased tasks are finished by their workers"""
+        self._transaction(lambda connection: connection.execute(
+            "UPDATE tasks SET status = ?, updated_at = ? WHERE run_id = ? AND status = ?",
+            (CANCELLED, time.time(), str(run_id), PENDING)
+        ))
+
+    def tasks(self, run_id: str) -> list[dict]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT * FROM tasks WHERE run_id = ? ORDER BY task_id", (str(run_id),)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def run_status(self, run_id: str) -> dict[str, int]:
+        """Number of tasks of a run per status, e.g. {"done": 3, "leased": 2}"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT status, COUNT(*) AS n FROM tasks WHERE run_id = ? GROUP BY status", (str(run_id),)
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def is_finished(self, run_id: str) -> bool:
+        status = self.run_status(run_id)
+        return bool(status) and status.get(PENDING, 0) == 0 and status.get(LEASED, 0) == 0
+
+
+class QueuedRun:
+    """A run enqueued for the workers, with the interface of graph.BackgroundRun so the app
+    can poll either one. Progress is rebuilt from the task table on every access."""
+
+    def __init__(self, queue: JobQueue, state: dict):
+        self.queue = queue
+        self.state = state
+        self.run_id = queue.enqueue_run(state)
+        self.cancelled = False
+        self.error: Exception | None = None
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+
+    @property
+    def done(self) -> bool:
+        if self.finished_at is None and self.queue.is_finished(self.run_id):
+            self.finished_at = time.perf_counter()
+            status = self.queue.run_status(self.run_id)
+            self.cancelled = status.get(CANCELLED, 0) > 0
+            finalize = [task for task in self.queue.tasks(self.run_id) if task["stage"] == "finalize"]
+            if finalize and finalize[0]["status"] == FAILED:
+                self.error = RuntimeError(finalize[0]["error"])
+        return self.finished_at is not None
+
+    @property
+    def output(self) -> dict | None:
+        return {**self.state, "indexed": True} if self.done and self.error is None else None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def progress(self) -> RunProgress:
+        progress = RunProgress()
+        for task in self.queue.tasks(self.run_id):
+            status = {LEASED: "running", PENDING: "pending"}.get(task["status"], task["status"])
+            if task["stage"] == "finalize":
+                if task["status"] == DONE:
+                    progress.report("node", "finalize", "done")
+                continue
+            progress.report(task["stage"], task["file_path"], status, error=task["error"], worker=task["worker_id"])
+        if self.cancelled:
+            progress.cancel()
+        return progress
+
+    def cancel(self) -> None:
+        self.queue.cancel_run(self.run_id)
+        self.cancelled = True
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import warnings
+import threading
+from pathlib import Path
+from typing import Any, Optional, Sequence, Union
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+from langchain_core._api import LangChainBetaWarning
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+"""
+
+# Entries deleted per eviction query, eviction frees space down to this fraction of max_bytes
+# so a full cache is not evicted again on every update
+EVICT_BATCH = 64
+EVICT_TARGET_RATIO = 0.9
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Drop the per-call message ids from a serialized list of messages.
+
+    Ids of earlier AI messages differ between runs, without them the later turns of an
+    agent loop over the same data map to the same key.
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    if not isinstance(messages, list):
+        return prompt
+    for message in messages:
+        if isinstance(message, dict) and isinstance(message.get("kwargs"), dict):
+            message["kwargs"].pop("id", None)
+    return json.dumps(messages, sort_keys=True)
+
+
+class SQLiteLLMCache(BaseCache):
+    """Persistent exact-match cache of model responses for the LangChain model `cache` parameter.
+
+    LangChain looks responses up by the serialized messages (`prompt`) and the model's
+    parameters (`llm_string`: model name, temperature, bound tools or structured output
+    schema, ...). Both are hashed into the key after dropping message ids. Entries older than
+    `ttl_seconds` are ignored and removed, and the least recently used entries are evicted
+    once the stored responses exceed `max_bytes`. The stored size is kept as a running total,
+    the table is only summed again when the total exceeds `max_bytes` (other processes may
+    share the database).
+    """
+
+    def __init__(self, db_path: Union[str, os.PathLike], ttl_seconds: Optional[float] = None, max_bytes: int = 256 * 1024 * 1024):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript(SCHEMA)
+            self.total_bytes = self._stored_bytes()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        """Return the cached generations or None, updating the hit/miss counters."""
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT response, created_at, size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= row[2]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        try:
+            # loads is a beta API and warns on every call, which floods stderr on cache hits
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", LangChainBetaWarning)
+                return loads(row[0])
+        except Exception:
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        """Store the generations of a call and evict old entries if the cache exceeds max_bytes."""
+        response = dumps(list(return_val))
+        now = time.time()
+        key = self.key(prompt, llm_string)
+        with self.lock, self.connection:
+            replaced = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response), now, now)
+            )
+            self.total_bytes += len(response) - (replaced[0] if replaced is not None else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _stored_bytes(self) -> int:
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self) -> None:
+        """Remove expired entries, then the least recently used ones in batches until the
+        cache is below EVICT_TARGET_RATIO of max_bytes."""
+        if self.ttl_seconds is not None:
+            self.connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self.total_bytes = self._stored_bytes()
+        while self.total_bytes > self.max_bytes * EVICT_TARGET_RATIO:
+            sizes = self.connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used_at LIMIT ?) RETURNING size",
+                (EVICT_BATCH,)
+            ).fetchall()
+            if not sizes:
+                break
+            self.total_bytes -= sum(size for size, in sizes)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses")
+            self.total_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit/miss counters for this cache instance."""
+        return {"hits": self.hits, "misses": self.misses}
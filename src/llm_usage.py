@@ -0,0 +1,59 @@
+import threading
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+class LLMUsage(BaseCallbackHandler):
+    """Counts the calls, errors and tokens of every model it is attached to.
+
+    Attached to the models when they are built (see agents.py), so it also sees the calls
+    made from the thread pools of the cleaning and indexing nodes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls = 0
+            self.errors = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        with self.lock:
+            self.calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        with self.lock:
+            self.calls += 1
+
+    def on_llm_error(self, error: BaseException, **kwargs) -> None:
+        with self.lock:
+            self.errors += 1
+
+    def on_llm_end(self, response: LLMResult, **kwargs) -> None:
+        prompt_tokens, completion_tokens = 0, 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        with self.lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def snapshot(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens
+            }
+
+
+# Shared by all models of the process
+llm_usage = LLMUsage()
@@ -0,0 +1,72 @@
+from typing import List
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+import constants
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough token count of messages (about 4 characters per token), tool call arguments included"""
+    chars = 0
+    for message in messages:
+        chars += len(str(message.content))
+        if isinstance(message, AIMessage):
+            chars += sum(len(str(call.get("args", ""))) for call in message.tool_calls)
+    return chars // 4
+
+
+def clip_tool_output(content: str, max_chars: int) -> str:
+    if len(content) <= max_chars:
+        return content
+    return f"{content[:max_chars]}\n... [{len(content) - max_chars} characters truncated]"
+
+
+def compact_messages(
+        messages: List[BaseMessage],
+        token_budget: int = constants.CLEAN_AGENT_CONTEXT_TOKEN_BUDGET,
+        max_tool_chars: int = constants.CLEAN_AGENT_TOOL_OUTPUT_MAX_CHARS,
+        keep_recent: int = constants.CLEAN_AGENT_KEEP_RECENT_TOOL_OUTPUTS
+    ) -> List[BaseMessage]:
+    """Bound the messages sent to the model within one agent loop.
+
+    Every tool output is clipped to max_tool_chars. If the messages still exceed the token
+    budget, the outputs of all but the `keep_recent` latest tool calls are replaced by a short
+    note, oldest first. Human and AI messages (and so every tool call and its id) are kept, so
+    the transcript stays valid for the model.
+    """
+    compacted = [
+        message.model_copy(update={"content": clip_tool_output(str(message.content), max_tool_chars)})
+        if isinstance(message, ToolMessage) and len(str(message.content)) > max_tool_chars else message
+        for message in messages
+    ]
+
+    tool_indices = [i for i, message in enumerate(compacted) if isinstance(message, ToolMessage)]
+    older = tool_indices[:-keep_recent] if keep_recent > 0 else tool_indices
+    tokens = estimate_tokens(compacted)
+    for i in older:
+        if tokens <= token_budget:
+            break
+        message = compacted[i]
+        note = f"[Output of {message.name or 'tool'} elided to save context, call it again if needed]"
+        tokens -= (len(str(message.content)) - len(note)) // 4
+        compacted[i] = message.model_copy(update={"content": note})
+
+    return compacted
+
+
+def pre_model_hook(state: dict) -> dict:
+    """pre_model_hook of the cleaning agent: the model sees the compacted messages, the agent
+    state keeps the full transcript of the file"""
+    return {"llm_input_messages": compact_messages(state["messages"])}
+
+
+def summarize_cleaning(messages: List[BaseMessage], operations: List[dict], output_path: str, shape: tuple, replayed: bool) -> dict:
+    """Compact summary of one cleaned file, kept in the shared state instead of its transcript"""
+    final = next((m for m in reversed(messages) if isinstance(m, AIMessage) and not m.tool_calls), None)
+    return {
+        "output_path": output_path,
+        "rows": int(shape[0]),
+        "columns": int(shape[1]),
+        "operations": [operation["tool"] for operation in operations],
+        "replayed_cached_plan": replayed,
+        "tool_calls": sum(len(m.tool_calls) for m in messages if isinstance(m, AIMessage)),
+        "agent_summary": clip_tool_output(str(final.content), constants.CLEAN_SUMMARY_MAX_CHARS) if final is not None else ""
+    }
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import cProfile
+import threading
+from uuid import UUID
+from typing import Any, Callable, Optional, Union
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+import constants
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """Records latency, tokens and errors of every model call of a run, and the retries of
+    models wrapped with `with_retry` (it tags the runs of every attempt after the first with
+    "retry:attempt:<n>") or emitting retry callbacks.
+
+    Passed in the callbacks of the run configuration, so it also sees the calls made by
+    the cleaning agent and the indexing batch.
+    """
+
+    def __init__(self, metrics: "RunMetrics"):
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.started: dict[UUID, tuple[float, str]] = {}
+
+    def _start(self, run_id: UUID, kwargs: dict) -> None:
+        self._count_retry(kwargs)
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or params.get("_type") or "unknown"
+        with self.lock:
+            self.started[run_id] = (time.perf_counter(), str(model))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._start(run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs) -> None:
+        self._start(run_id, kwargs)
+
+    def _count_retry(self, kwargs: dict) -> None:
+        for tag in kwargs.get("tags") or []:
+            if tag.startswith("retry:attempt:"):
+                self.metrics.record("retry", {"source": "llm", "reason": tag})
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, **kwargs) -> None:
+        # The attempt tag is not inherited, it is on the run wrapped by with_retry (e.g. model | parser)
+        self._count_retry(kwargs)
+
+    def on_retry(self, retry_state, *, run_id: UUID, **kwargs) -> None:
+        outcome = getattr(retry_state, "outcome", None)
+        error = outcome.exception() if outcome is not None and outcome.failed else None
+        self.metrics.record("retry", {"source": "llm", "reason": str(error) if error is not None else None})
+
+    def _end(self, run_id: UUID, prompt_tokens: int, completion_tokens: int, error: Optional[str]) -> None:
+        with self.lock:
+            start, model = self.started.pop(run_id, (time.perf_counter(), "unknown"))
+        self.metrics.record("llm", {
+            "model": model,
+            "latency_s": time.perf_counter() - start,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "error": error
+        })
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs) -> None:
+        prompt_tokens, completion_tokens = 0, 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        self._end(run_id, prompt_tokens, completion_tokens, None)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, 0, 0, str(error))
+
+
+class RunMetrics:
+    """Hot-path metrics of a run: one record per LLM call, tool call, graph node, model
+    routing decision (see model_routing.py) and retry. Retries are counted by source: "llm"
+    (with_retry of a model), "escalation" (a file repeated on the hosted model), "replay" (a
+    cached cleaning plan that failed and was cleaned by the agent) and "task" (a queue task
+    run again).
+
+    Exported as metrics.json (all records and per-name summaries) and as a Prometheus
+    text-exposition file in the output directory of the run.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.lock = threading.Lock()
+        self.records: dict[str, list[dict]] = {"llm": [], "tool": [], "node": [], "routing": [], "retry": []}
+        self.callback = MetricsCallback(self)
+
+    def record(self, kind: str, record: dict) -> None:
+        with self.lock:
+            self.records[kind].append({"time": time.time(), **record})
+
+    def summary(self) -> dict[str, dict[str, dict]]:
+        """Count, total/max latency and summed numeric fields per model, tool, node, routing tier and retry source"""
+        keys = {"llm": "model", "tool": "tool", "node": "node", "routing": "tier", "retry": "source"}
+        with self.lock:
+            records = {kind: list(values) for kind, values in self.records.items()}
+
+        summary = {}
+        for kind, values in records.items():
+            summary[kind] = {}
+            for record in values:
+                entry = summary[kind].setdefault(record[keys[kind]], {"count": 0, "errors": 0})
+                entry["count"] += 1
+                entry["errors"] += record.get("error") is not None
+                if "latency_s" in record:
+                    entry["latency_s_sum"] = entry.get("latency_s_sum", 0.0) + record["latency_s"]
+                    entry["latency_s_max"] = max(entry.get("latency_s_max", 0.0), record["latency_s"])
+                for field in ["prompt_tokens", "completion_tokens", "output_chars"]:
+                    if field in record:
+                        entry[f"{field}_sum"] = entry.get(f"{field}_sum", 0) + record[field]
+        return summary
+
+    def to_prometheus(self) -> str:
+        names = {"llm": ("pipeline_llm", "model"), "tool": ("pipeline_tool", "tool"), "node": ("pipeline_node", "node"), "routing": ("pipeline_routing", "tier"), "retry": ("pipeline_retries", "source")}
+        lines = []
+        for kind, entries in self.summary().items():
+            prefix, label = names[kind]
+            metrics = [("total", "counter", "count", "Number of retries")] if kind == "retry" else [
+                ("calls_total", "counter", "count", "Number of calls"),
+                ("errors_total", "counter", "errors", "Number of failed calls"),
+                ("seconds_sum", "counter", "latency_s_sum", "Total latency in seconds"),
+                ("seconds_max", "gauge", "latency_s_max", "Maximum latency in seconds"),
+                ("prompt_tokens_total", "counter", "prompt_tokens_sum", "Prompt tokens"),
+                ("completion_tokens_total", "counter", "completion_tokens_sum", "Completion tokens"),
+                ("output_chars_total", "counter", "output_chars_sum", "Characters of tool output")
+            ]
+            for suffix, metric_type, field, help_text in metrics:
+                samples = [(name, entry[field]) for name, entry in entries.items() if field in entry]
+                if not samples:
+                    continue
+                lines.append(f"# HELP {prefix}_{suffix} {help_text}")
+                lines.append(f"# TYPE {prefix}_{suffix} {metric_type}")
+                for name, value in samples:
+                    escaped = str(name).replace("\\", "\\\\").replace('"', '\\"')
+                    lines.append(f'{prefix}_{suffix}{{run="{self.run_id}",{label}="{escaped}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, output_path: Union[str, os.PathLike], suffix: str = "") -> None:
+        """Write metrics.json and the Prometheus file to the output directory (atomically).
+
+        Workers pass a suffix so each task of a run writes its own files.
+        """
+        with self.lock:
+            records = {kind: list(values) for kind, values in self.records.items()}
+        content = {"run_id": self.run_id, "summary": self.summary(), "records": records}
+        for file_name, text in [
+            (constants.METRICS_FILE_NAME, json.dumps(content, indent=2, default=str)),
+            (constants.METRICS_PROMETHEUS_FILE_NAME, self.to_prometheus())
+        ]:
+            stem, extension = os.path.splitext(file_name)
+            file_path = os.path.join(output_path, f"{stem}{suffix}{extension}")
+            with open(f"{file_path}.tmp", "w") as f:
+                f.write(text)
+            os.replace(f"{file_path}.tmp", file_path)
+
+
+# Metrics of the runs in this process by run uuid
+_runs: dict[str, RunMetrics] = {}
+_runs_lock = threading.Lock()
+
+
+def get_metrics(run_id) -> RunMetrics:
+    """Metrics of a run, created on first use"""
+    with _runs_lock:
+        return _runs.setdefault(str(run_id), RunMetrics(str(run_id)))
+
+
+def drop_metrics(run_id) -> None:
+    """Forget the metrics of a finished run, they were exported after its last node"""
+    with _runs_lock:
+        _runs.pop(str(run_id), None)
+
+
+class NodeProfiler:
+    """Process-wide cProfile shared by the nodes that run at the same time.
+
+    Since Python 3.12 a profiler sees the calls of every thread (the thread pools of the
+    nodes included) and only one can be active per process, so nodes running in parallel
+    share one profile. It is written when the last of them finishes, to the path of the
+    node that started it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profiler: Optional[cProfile.Profile] = None
+        self.path: Optional[str] = None
+        self.active = 0
+
+    def start(self, path: str) -> str:
+        """Profile until the matching stop, returns the path the profile is written to"""
+        with self.lock:
+            if self.profiler is None:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+                self.path = path
+            self.active += 1
+            return self.path
+
+    def stop(self) -> None:
+        with self.lock:
+            self.active -= 1
+            if self.active > 0:
+                return
+            profiler, path = self.profiler, self.path
+            self.profiler, self.path = None, None
+            profiler.disable()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profiler.dump_stats(path)
+
+
+node_profiler = NodeProfiler()
+
+
+def instrument_node(name: str, node: Callable[[Any], Any], export_suffix: str = "") -> Callable[[Any], Any]:
+    """Wrap a graph node to record its latency, export the run metrics once it finished and
+    optionally (state["profile_nodes"]) profile it to output/profiles/<name>.prof, see NodeProfiler"""
+
+    def run(state):
+        metrics = get_metrics(state.get("uuid"))
+        output_path = os.path.join(state["memory_path"], "output")
+        profile = None
+        if state.get("profile_nodes", constants.PROFILE_NODES):
+            profile = node_profiler.start(os.path.join(output_path, "profiles", f"{name}.prof"))
+        error = None
+        start = time.perf_counter()
+        try:
+            return node(state)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            record = {"node": name, "latency_s": time.perf_counter() - start, "error": error}
+            try:
+                if profile is not None:
+                    node_profiler.stop()
+                    record["profile"] = profile
+                metrics.record("node", record)
+                metrics.export(output_path, export_suffix)
+            except OSError as e:
+                print(f"Error exporting metrics of node {name}: {str(e)}")
+
+    run.__name__ = getattr(node, "__name__", name)
+    return run
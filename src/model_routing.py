@@ -0,0 +1,124 @@
+import os
+from typing import List, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+import agents
+import constants
+
+# Tiers of a routed role, DEFAULT is the configured model of the role when routing is disabled
+LOCAL = "local"
+HOSTED = "hosted"
+DEFAULT = "default"
+
+
+def is_type_problem(column: dict) -> bool:
+    """Text column of a profile_dataframe result that holds (mostly or partly) numbers or dates"""
+    if column.get("semantic_type", "").endswith("(stored as text)"):
+        return True
+    parse_rate = max(column.get("numeric_parse_rate", 0.0), column.get("datetime_parse_rate", 0.0))
+    return 0.2 <= parse_rate < 0.9
+
+
+def route_table(profile: dict) -> Tuple[str, dict]:
+    """Pick the tier for cleaning a table from its profile_dataframe result.
+
+    Tables with few columns, few nulls and few type problems go to the local model.
+
+    Returns:
+        Tuple[str, dict]: The tier and the profile features it was picked from, with the reasons for the hosted tier
+    """
+    columns = profile.get("columns", {})
+    cells = profile.get("shape", {}).get("rows", 0) * len(columns)
+    null_ratio = sum(column["nulls"] for column in columns.values()) / cells if cells else 0.0
+    type_problems = sum(is_type_problem(column) for column in columns.values())
+    route = {"columns": len(columns), "null_ratio": round(null_ratio, 3), "type_problems": type_problems, "reasons": []}
+    if not constants.MODEL_ROUTING:
+        return DEFAULT, route
+
+    if len(columns) > constants.ROUTING_MAX_COLUMNS:
+        route["reasons"].append(f"{len(columns)} columns")
+    if null_ratio > constants.ROUTING_MAX_NULL_RATIO:
+        route["reasons"].append(f"null ratio {null_ratio:.2f}")
+    if type_problems > constants.ROUTING_MAX_TYPE_PROBLEMS:
+        route["reasons"].append(f"{type_problems} columns with type problems")
+    return (HOSTED if route["reasons"] else LOCAL), route
+
+
+def route_document(file_path: str) -> Tuple[str, dict]:
+    """Pick the tier for indexing a file from its type and size, small files go to the local model.
+
+    The content sent to the model is capped at the same length for every file, so the size of
+    the file itself is what tells a short note from a long report or a large table.
+    """
+    file_type = os.path.splitext(file_path)[1].lower()
+    try:
+        file_bytes = os.path.getsize(file_path)
+    except OSError:
+        file_bytes = 0
+    route = {"file_type": file_type, "file_bytes": file_bytes, "reasons": []}
+    if not constants.MODEL_ROUTING:
+        return DEFAULT, route
+
+    if file_type in constants.ROUTING_HOSTED_FILE_TYPES:
+        route["reasons"].append(f"{file_type} file")
+    if file_bytes > constants.ROUTING_MAX_FILE_BYTES:
+        route["reasons"].append(f"{file_bytes / 1024**2:.1f} MB file")
+    return (HOSTED if route["reasons"] else LOCAL), route
+
+
+def escalated_route(error: str) -> Tuple[str, dict]:
+    """Route of a file whose local run failed"""
+    return HOSTED, {"reasons": [f"escalated after: {error}"], "escalated_from": LOCAL}
+
+
+def tool_failures(messages: List[BaseMessage]) -> int:
+    """Number of tool calls of an agent run that could not be parsed or raised an error"""
+    failures = 0
+    for message in messages:
+        if isinstance(message, AIMessage):
+            failures += len(message.invalid_tool_calls)
+        elif isinstance(message, ToolMessage) and message.status == "error":
+            failures += 1
+    return failures
+
+
+def cleaning_agent(tier: str):
+    return agents.get_local_agent_data_clean() if tier == LOCAL else agents.get_agent_data_clean()
+
+
+def indexing_llm(tier: str):
+    if tier == LOCAL:
+        return agents.get_local_indexing_llm()
+    if tier == HOSTED:
+        return agents.get_hosted_indexing_llm()
+    return agents.get_indexing_llm()
+
+
+def model_name(role: str, tier: str) -> str:
+    """Model serving a tier of the "data_cleaning" or "indexing" role"""
+    if tier == LOCAL:
+        return agents.local_model_name
+    if role == "data_cleaning":
+        return agents.data_cleaning_model_name
+    return agents.hosted_indexing_model_name if tier == HOSTED else agents.indexing_model_name
+
+
+def cache_model_name(role: str) -> str:
+    """Model name the plan and index caches of a role are keyed by, all tiers of a routed role share them"""
+    if not constants.MODEL_ROUTING:
+        return model_name(role, DEFAULT)
+    return f"{model_name(role, LOCAL)}|{model_name(role, HOSTED)}"
+
+
+def record_route(metrics, stage: str, file: str, tier: str, route: dict, latency_s: float, error: Optional[str] = None) -> None:
+    """Record a routing decision and the outcome of its run in the run metrics"""
+    if tier == DEFAULT:
+        return
+    metrics.record("routing", {
+        "tier": tier,
+        "model": model_name("data_cleaning" if stage == "clean" else "indexing", tier),
+        "stage": stage,
+        "file": file,
+        "latency_s": latency_s,
+        "error": error,
+        **route
+    })
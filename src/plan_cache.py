@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from index_cache import CacheDirectory
+
+
+def dtype_kind(dtype) -> str:
+    """Coarse kind of a dtype, independent of the value-dependent downcasts of optimize_dtypes"""
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    return "string"
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """Fingerprint of a dataframe's schema: column names, dtype kinds and which columns contain nulls.
+
+    Two exports of the same feed with different rows map to the same fingerprint as long as
+    the coarse profile matches, int8 vs int16 or category vs string do not matter.
+    """
+    has_nulls = df.isna().any().to_dict()
+    schema = [
+        [str(column), dtype_kind(dtype), bool(has_nulls[column])]
+        for column, dtype in df.dtypes.items()
+    ]
+    return hashlib.sha256(json.dumps(schema).encode("utf-8")).hexdigest()
+
+
+class CleaningPlanCache:
+    """Persistent cache of cleaning plans keyed by schema fingerprint.
+
+    A plan is the list of {"tool": ..., "args": ...} operations recorded on the
+    DataFrameContext while the cleaning agent ran. Entries are versioned by the cleaning
+    prompt and model, and evicted least recently used first once max_bytes is exceeded.
+    """
+
+    def __init__(self, cache_dir: Union[str, os.PathLike], model_name: str, prompt: str, max_bytes: int = 16 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.directory = CacheDirectory(self.cache_dir, max_bytes)
+        self.version = hashlib.sha256(f"{model_name}\n{prompt}".encode("utf-8")).hexdigest()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, df: pd.DataFrame) -> str:
+        """Cache key for a dataframe: schema fingerprint combined with the model/prompt version."""
+        return hashlib.sha256(f"{schema_fingerprint(df)}:{self.version}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Return the cached plan for key or None, updating the hit/miss counters."""
+        entry_path = self.cache_dir / f"{key}.json"
+        try:
+            with open(entry_path, "r", encoding="utf-8") as f:
+                plan = json.load(f)
+            os.utime(entry_path)  # Mark as recently used
+            self.hits += 1
+            return plan
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+    def put(self, key: str, plan: List[Dict]) -> None:
+        """Store a plan and evict old entries if the cache exceeds max_bytes."""
+        self.directory.write(key, json.dumps(plan))
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit/miss counters for this cache instance."""
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,80 @@
+import os
+import json
+import uuid
+import fcntl
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Union
+
+
+# Graph branches running in parallel each open their own manifest of the same run
+_file_locks: dict[str, threading.Lock] = {}
+_file_locks_lock = threading.Lock()
+
+
+def _file_lock(path: Union[str, os.PathLike]) -> threading.Lock:
+    with _file_locks_lock:
+        return _file_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class RunManifest:
+    """Per-file completion markers of a run, stored as JSON in the run directory.
+
+    Each stage ("clean", "index", ...) maps a file path to the content hash it was
+    completed for, so re-invoking the graph skips finished files and a changed file is
+    processed again. Every update re-reads the manifest and rewrites it atomically under an
+    exclusive lock on <manifest>.lock, so instances in other threads, processes or hosts
+    (parallel graph branches, queue workers) do not lose each other's entries.
+    """
+
+    def __init__(self, manifest_path: Union[str, os.PathLike]):
+        self.manifest_path = manifest_path
+        self.lock = _file_lock(manifest_path)
+        self.entries = self._read()
+
+    def _read(self) -> dict[str, dict[str, dict]]:
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread lock of this process and the file lock shared with other processes"""
+        with self.lock, open(f"{self.manifest_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def is_done(self, stage: str, file_path: str, content_hash: str) -> bool:
+        """Whether the file was completed in this stage with the same content."""
+        with self.lock:
+            entry = self.entries.get(stage, {}).get(file_path)
+        return entry is not None and entry["content_hash"] == content_hash
+
+    def get(self, stage: str, file_path: str) -> Optional[dict]:
+        with self.lock:
+            return self.entries.get(stage, {}).get(file_path)
+
+    def reload(self) -> None:
+        """Pick up the entries written by other instances since this one was opened."""
+        with self._locked():
+            self.entries = self._read()
+
+    def mark_done(self, stage: str, file_path: str, content_hash: str, **info) -> None:
+        """Mark a file as completed in a stage, extra info (e.g. the output path) is stored with it."""
+        with self._locked():
+            self.entries = self._read()
+            self.entries.setdefault(stage, {})[file_path] = {
+                "content_hash": content_hash,
+                "completed_at": datetime.now().isoformat(),
+                **info
+            }
+            tmp_path = f"{self.manifest_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,83 @@
+import threading
+from datetime import datetime
+from typing import Optional
+
+
+class RunCancelled(Exception):
+    """Raised inside a graph node once its run was cancelled.
+
+    The node fails instead of returning, so the checkpoint keeps it as the next node to
+    run and resuming the run continues with the files that were not finished.
+    """
+
+
+class RunProgress:
+    """Progress events and the cancel flag of a run, shared between the graph and the UI.
+
+    Nodes (and the thread pools they clean and index files in) report per-file events,
+    the background run reports finished nodes. The UI polls `events` and `counts` while
+    the graph runs and sets the cancel flag, which nodes check between files.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events: list[dict] = []
+        self.cancelled = threading.Event()
+
+    def report(self, stage: str, name: str, status: str, **info) -> None:
+        """Record an event, e.g. report("clean", file_path, "done", output_path=...)"""
+        with self.lock:
+            self.events.append({
+                "stage": stage,
+                "name": name,
+                "status": status,
+                "time": datetime.now().isoformat(),
+                **info
+            })
+
+    def snapshot(self, stage: Optional[str] = None) -> list[dict]:
+        """Copy of the events so far, optionally of a single stage"""
+        with self.lock:
+            return [event for event in self.events if stage is None or event["stage"] == stage]
+
+    def counts(self) -> dict[str, dict[str, int]]:
+        """Number of files per stage and latest status, e.g. {"clean": {"done": 3, "running": 1}}"""
+        latest = {}
+        for event in self.snapshot():
+            latest[(event["stage"], event["name"])] = event["status"]
+        counts = {}
+        for (stage, _), status in latest.items():
+            counts.setdefault(stage, {})
+            counts[stage][status] = counts[stage].get(status, 0) + 1
+        return counts
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def check_cancelled(self) -> None:
+        """Raise RunCancelled if the run was cancelled"""
+        if self.cancelled.is_set():
+            raise RunCancelled("Run was cancelled")
+
+
+# Progress of the runs in this process by run uuid
+_runs: dict[str, RunProgress] = {}
+_runs_lock = threading.Lock()
+
+
+def get_progress(run_id) -> RunProgress:
+    """Progress of a run, created on first use"""
+    with _runs_lock:
+        return _runs.setdefault(str(run_id), RunProgress())
+
+
+def reset_progress(run_id) -> RunProgress:
+    """Start the progress of a run from scratch, e.g. when the graph is (re)invoked"""
+    with _runs_lock:
+        _runs[str(run_id)] = RunProgress()
+        return _runs[str(run_id)]
+
+
+def drop_progress(run_id) -> None:
+    with _runs_lock:
+        _runs.pop(str(run_id), None)
@@ -5,6 +5,11 @@ from langgraph.graph.message import add_messages
 import uuid
 
 
+def merge_dicts(left: Dict | None, right: Dict | None) -> Dict:
+    """Reducer merging the per-file entries written by parallel nodes"""
+    return {**(left or {}), **(right or {})}
+
+
 class AgentState(TypedDict, total=False):
     """State for the data cleaning agent."""
     messages: Annotated[List[BaseMessage], add_messages]
@@ -13,4 +18,12 @@ class AgentState(TypedDict, total=False):
     current_df: Any  # pd.DataFrame
     indexed: bool = False
     debug: bool = False
+    index_concurrency: int
+    clean_concurrency: int
+    memory_budget_bytes: int
+    output_format: str
+    tabular_files: List[str]
+    document_files: List[str]
+    file_summaries: Annotated[Dict[str, Dict], merge_dicts]  # Compact summary per cleaned file, not its transcript
+    profile_nodes: bool
     remaining_steps: int
\ No newline at end of file
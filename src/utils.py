@@ -1,10 +1,17 @@
 import os
+import uuid
+import hashlib
 import pandas as pd
 from langgraph.graph.graph import CompiledGraph
 from pathlib import Path
 from PyPDF2 import PdfReader
 from docx import Document
-from typing import Union
+from collections import deque
+from openpyxl import load_workbook
+import pyarrow as pa
+import pyarrow.dataset
+from pyarrow.parquet import ParquetFile
+from typing import BinaryIO, Iterable, Optional, Union
 
 def convert_to_png(graph: CompiledGraph, image_name: str = "graph") -> None:
     try:
@@ -17,11 +24,174 @@ def convert_to_png(graph: CompiledGraph, image_name: str = "graph") -> None:
         print(f"Exception: {e}")
 
 
-def load_file_context(file_path: Union[str, os.PathLike]) -> str:
+def list_data_files(memory_path: Union[str, os.PathLike]) -> list[str]:
+    """Absolute paths of all files in the data directory of a run, sorted."""
+    file_paths = []
+    for root, dirs, files_ in os.walk(os.path.join(memory_path, "data")):
+        for file in files_:
+            file_paths.append(os.path.abspath(os.path.join(root, file)))
+    return sorted(file_paths)
+
+
+def spool_upload(
+        source: BinaryIO,
+        file_name: str,
+        data_path: Union[str, os.PathLike],
+        known_hashes: Iterable[str] = (),
+        chunk_size: int = 8 * 1024 * 1024
+    ) -> Optional[dict]:
+    """Copy an uploaded file to the data directory in chunks, hashing it on the way.
+
+    The file is written to a temporary name first and dropped if its content hash is one of
+    `known_hashes`. A different file with an existing name is stored as "<stem> (n)<suffix>".
+
+    Returns:
+        Optional[dict]: name, path, content_hash and size of the stored file, None if it was a duplicate
+    """
+    os.makedirs(data_path, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(data_path, f".{uuid.uuid4().hex}.upload")
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := source.read(chunk_size):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    content_hash = digest.hexdigest()
+    if content_hash in set(known_hashes):
+        os.remove(tmp_path)
+        return None
+
+    stem, suffix = os.path.splitext(os.path.basename(file_name))
+    name, n = f"{stem}{suffix}", 1
+    while os.path.exists(os.path.join(data_path, name)):
+        name, n = f"{stem} ({n}){suffix}", n + 1
+    file_path = os.path.join(data_path, name)
+    os.replace(tmp_path, file_path)
+
+    return {"name": name, "path": file_path, "content_hash": content_hash, "size": size}
+
+
+def clip_head_tail(text: str, max_chars: int) -> str:
+    """Keep the first and last max_chars // 2 characters of a text that exceeds max_chars."""
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"Head of file: {text[:half]} \n Tail of file: {text[-half:]}"
+
+
+def read_text_head_tail(path: Path, max_chars: int) -> str:
+    """Read the head of a text file and seek from the end for its tail.
+
+    Only about max_chars characters are read regardless of the file size.
+    """
+    half = max_chars // 2
+    file_size = path.stat().st_size
+
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        head = f.read(max_chars + 1)
+    if len(head) <= max_chars:
+        return head
+
+    # UTF-8 uses at most 4 bytes per character
+    with open(path, 'rb') as f:
+        f.seek(max(0, file_size - 4 * half))
+        tail = f.read().decode('utf-8', errors='ignore')[-half:]
+
+    return f"Head of file: {head[:half]} \n Tail of file: {tail}"
+
+
+def read_spreadsheet_head_tail(path: Path, n_rows: int) -> pd.DataFrame:
+    """Read the header, the first n_rows and the last n_rows of a spreadsheet."""
+
+    if path.suffix.lower() == '.xlsx':
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            rows = sheet.iter_rows(values_only=True)
+            columns = next(rows, ())
+            head_rows = [row for _, row in zip(range(n_rows), rows)]
+            # The remaining rows are streamed, only the last n_rows are kept in memory
+            tail_rows = deque(rows, maxlen=n_rows)
+        finally:
+            workbook.close()
+        head = pd.DataFrame(head_rows, columns=columns)
+        tail = pd.DataFrame(list(tail_rows), columns=columns)
+
+    else:  # Legacy xls files are bounded to 65536 rows by the format
+        df = pd.read_excel(path)
+        head, tail = df.head(n_rows), df.iloc[n_rows:].tail(n_rows)
+
+    return pd.concat([head, tail], ignore_index=True)
+
+
+def read_columnar_head_tail(path: Path, n_rows: int) -> pd.DataFrame:
+    """Read the first n_rows and the last n_rows of a parquet or feather/arrow file.
+
+    The row count comes from the file metadata and only the first and last row groups (record
+    batches) holding the rows are read, the tail of a parquet row group in batches of n_rows,
+    so memory is bounded regardless of the file size.
+    """
+    if path.suffix.lower() == '.parquet':
+        parquet_file = ParquetFile(path)
+        metadata = parquet_file.metadata
+        if metadata.num_rows <= 2 * n_rows:
+            return parquet_file.read().to_pandas()
+        head = next(parquet_file.iter_batches(batch_size=n_rows)).to_pandas()
+
+        # Row groups holding the last n_rows, read batch by batch keeping the last two
+        row_groups, tail_rows = [], 0
+        for i in reversed(range(metadata.num_row_groups)):
+            row_groups.insert(0, i)
+            tail_rows += metadata.row_group(i).num_rows
+            if tail_rows >= n_rows:
+                break
+        batches = deque(parquet_file.iter_batches(batch_size=n_rows, row_groups=row_groups), maxlen=2)
+        tail = pa.Table.from_batches(batches).to_pandas()
+    else:
+        # Counted from the batch metadata, without decompressing the batches
+        num_rows = pa.dataset.dataset(str(path), format='ipc').count_rows()
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            if num_rows <= 2 * n_rows:
+                return reader.read_all().to_pandas()
+            batches, head_rows = [], 0
+            for i in range(reader.num_record_batches):
+                batches.append(reader.get_batch(i).slice(0, n_rows - head_rows))
+                head_rows += batches[-1].num_rows
+                if head_rows >= n_rows:
+                    break
+            head = pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+
+            batches, tail_rows = deque(), 0
+            for i in reversed(range(reader.num_record_batches)):
+                batch = reader.get_batch(i)
+                batches.appendleft(batch.slice(max(0, batch.num_rows - (n_rows - tail_rows))))
+                tail_rows += batches[0].num_rows
+                if tail_rows >= n_rows:
+                    break
+            tail = pa.Table.from_batches(list(batches), schema=reader.schema).to_pandas()
+
+    return pd.concat([head, tail.tail(n_rows)], ignore_index=True)
+
+
+def load_file_context(
+        file_path: Union[str, os.PathLike],
+        max_chars: Optional[int] = None,
+        max_rows: int = 10
+    ) -> str:
     """Load and process file data into a text string for LLM context.
 
     Args:
         file_path (Union[str, os.PathLike]): Path to the file to be loaded
+        max_chars (Optional[int]): If set, only read a bounded head and tail of the file and
+            return at most roughly max_chars characters. If None the full file is read.
+        max_rows (int): Number of rows read from each end of a spreadsheet when max_chars is set
 
     Returns:
         str: Text content of the file or an error message
@@ -43,6 +213,8 @@ def load_file_context(file_path: Union[str, os.PathLike]) -> str:
         
         # Text-based files
         if file_ext in ['txt']:
+            if max_chars is not None:
+                return read_text_head_tail(path, max_chars)
             with open(path, 'r', encoding='utf-8') as f:
                 return f.read()
                 
@@ -50,7 +222,8 @@ def load_file_context(file_path: Union[str, os.PathLike]) -> str:
         elif file_ext in ['docx']:
             try:
                 doc = Document(path)
-                return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
+                text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
+                return clip_head_tail(text, max_chars) if max_chars is not None else text
             except Exception as e:
                 return f"Error reading Word document: {str(e)}"
                 
@@ -59,20 +232,40 @@ def load_file_context(file_path: Union[str, os.PathLike]) -> str:
             try:
                 with open(path, 'rb') as f:
                     reader = PdfReader(f)
+                    pages = reader.pages
+                    # Only the first and last pages are needed for a bounded read
+                    if max_chars is not None and len(pages) > 2:
+                        pages = [pages[0], pages[-1]]
                     text = []
-                    for page in reader.pages:
+                    for page in pages:
                         page_text = page.extract_text()
                         if page_text:
                             text.append(page_text)
-                    return '\n'.join(text) if text else "No extractable text found in PDF"
+                    if not text:
+                        return "No extractable text found in PDF"
+                    text = '\n'.join(text)
+                    return clip_head_tail(text, max_chars) if max_chars is not None else text
             except Exception as e:
                 return f"Error reading PDF: {str(e)}"
                 
-        # Spreadsheet files
-        elif file_ext in ['csv', 'xls', 'xlsx']:
+        # Spreadsheet and columnar files
+        elif file_ext in ['csv', 'tsv', 'xls', 'xlsx', 'parquet', 'feather', 'arrow']:
             try:
-                if file_ext == 'csv':
-                    df = pd.read_csv(path)
+                if max_chars is not None:
+                    # Raw head and tail lines are enough context for csv/tsv files
+                    if file_ext in ['csv', 'tsv']:
+                        return read_text_head_tail(path, max_chars)
+                    elif file_ext in ['parquet', 'feather', 'arrow']:
+                        df = read_columnar_head_tail(path, max_rows)
+                    else:
+                        df = read_spreadsheet_head_tail(path, max_rows)
+                    return clip_head_tail(df.to_string(index=False), max_chars)
+                elif file_ext in ['csv', 'tsv']:
+                    df = pd.read_csv(path, sep='\t' if file_ext == 'tsv' else ',')
+                elif file_ext == 'parquet':
+                    df = pd.read_parquet(path)
+                elif file_ext in ['feather', 'arrow']:
+                    df = pd.read_feather(path)
                 else:  # xls or xlsx
                     df = pd.read_excel(path)
                 # Convert to string representation with tab separation
@@ -101,4 +294,33 @@ def load_file_context(file_path: Union[str, os.PathLike]) -> str:
         return f"Error: Permission denied when accessing {file_path}"
     except Exception as e:
         return f"Error processing file {file_path}: {str(e)}"
-    
\ No newline at end of file
+
+
+def column_summaries(file_path: Union[str, os.PathLike], n_rows: int = 100) -> dict[str, str]:
+    """Summarize each column of a tabular file from its first rows.
+
+    Returns:
+        dict[str, str]: Column name to a short text with the dtype, null count and example values
+    """
+    path = Path(file_path)
+    file_ext = path.suffix.lower()[1:]
+
+    if file_ext in ['csv', 'tsv']:
+        df = pd.read_csv(path, sep='\t' if file_ext == 'tsv' else ',', nrows=n_rows)
+    elif file_ext in ['xls', 'xlsx']:
+        df = read_spreadsheet_head_tail(path, n_rows // 2)
+    elif file_ext == 'parquet':
+        df = next(ParquetFile(path).iter_batches(batch_size=n_rows)).to_pandas()
+    elif file_ext in ['feather', 'arrow']:
+        df = read_columnar_head_tail(path, n_rows).head(n_rows)
+    else:
+        return {}
+
+    summaries = {}
+    for column in df.columns:
+        examples = ', '.join(str(value) for value in df[column].dropna().unique()[:5])
+        summaries[str(column)] = (
+            f"Column {column} of {path.name}. Type: {df[column].dtype}. "
+            f"Nulls in sample: {int(df[column].isna().sum())}. Examples: {examples}"
+        )
+    return summaries
\ No newline at end of file
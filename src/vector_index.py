@@ -0,0 +1,154 @@
+import os
+import re
+import json
+import zlib
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+
+## Embedders ##
+
+class HashingEmbedder:
+    """Offline embedder using the hashing trick over word unigrams and bigrams.
+
+    Tokens are hashed with crc32 (stable across processes) into `dim` buckets with a sign
+    taken from a second hash, and vectors are L2 normalized.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", text.lower())
+            for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                token_hash = zlib.crc32(token.encode("utf-8"))
+                sign = 1.0 if zlib.adler32(token.encode("utf-8")) & 1 else -1.0
+                vectors[row, token_hash % self.dim] += sign
+        return normalize(vectors)
+
+
+class LangChainEmbedder:
+    """Adapter for any LangChain `Embeddings` model (e.g. OllamaEmbeddings, OpenAIEmbeddings)."""
+
+    def __init__(self, embeddings, dim: int):
+        self.embeddings = embeddings
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return normalize(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+
+
+def get_embedder(name: str = "hashing"):
+    """Return the embedder for a name: "hashing" (offline default) or "ollama:<model>"."""
+    if name == "hashing":
+        return HashingEmbedder()
+    elif name.startswith("ollama:"):
+        from langchain_ollama import OllamaEmbeddings
+        embeddings = OllamaEmbeddings(model=name.split(":", 1)[1], base_url="http://localhost:11434")
+        return LangChainEmbedder(embeddings, dim=len(embeddings.embed_query("dimension probe")))
+    else:
+        raise ValueError(f"Unknown embedder: {name}")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+## Index ##
+
+class VectorIndex:
+    """Append-only vector index backed by a memory-mapped float32 matrix.
+
+    Vectors are appended to `vectors.f32` and their ids (with a version string such as the
+    content hash) to `ids.jsonl`. Re-adding an id appends a new row that shadows the old one.
+    Search is a single matrix-vector product over the memory map.
+    """
+
+    def __init__(self, index_dir: Union[str, os.PathLike], dim: int):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.index_dir / "vectors.f32"
+        self.ids_path = self.index_dir / "ids.jsonl"
+        self.dim = dim
+
+        # Vectors of different embedders can not be mixed in one matrix
+        meta_path = self.index_dir / "meta.json"
+        if meta_path.exists():
+            with open(meta_path, "r") as f:
+                stored_dim = json.load(f)["dim"]
+            if stored_dim != dim:
+                raise ValueError(f"Vector index at {index_dir} has dimension {stored_dim}, expected {dim}")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"dim": dim}, f)
+
+        self.ids: List[str] = []
+        self.versions: Dict[str, str] = {}
+        self.latest: Dict[str, int] = {}
+        if self.ids_path.exists():
+            with open(self.ids_path, "r", encoding="utf-8") as f:
+                for row, line in enumerate(f):
+                    entry = json.loads(line)
+                    self.ids.append(entry["id"])
+                    self.versions[entry["id"]] = entry["version"]
+                    self.latest[entry["id"]] = row
+
+        self.matrix: Optional[np.memmap] = None
+
+    def __len__(self) -> int:
+        return len(self.latest)
+
+    def version(self, id_: str) -> Optional[str]:
+        """Version stored for an id, used to skip re-embedding unchanged files."""
+        return self.versions.get(id_)
+
+    def add(self, ids: List[str], vectors: np.ndarray, versions: Optional[List[str]] = None) -> None:
+        """Append vectors (normalized on write) for ids."""
+        if len(ids) == 0:
+            return
+        vectors = normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim))
+        versions = versions or [""] * len(ids)
+
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.ids_path, "a", encoding="utf-8") as f:
+            for id_, version in zip(ids, versions):
+                f.write(json.dumps({"id": id_, "version": version}) + "\n")
+                self.latest[id_] = len(self.ids)
+                self.versions[id_] = version
+                self.ids.append(id_)
+
+        self.matrix = None  # Remapped on next search
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[Tuple[str, float]]:
+        """Return the top-k (id, cosine similarity) pairs for a query vector."""
+        if not self.ids:
+            return []
+        if self.matrix is None:
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+
+        scores = self.matrix @ normalize(np.asarray(query, dtype=np.float32).reshape(1, self.dim))[0]
+
+        # Rows shadowed by a later row with the same id are not returned
+        if len(self.latest) < len(self.ids):
+            mask = np.full(len(self.ids), -np.inf, dtype=np.float32)
+            mask[list(self.latest.values())] = 0
+            scores = scores + mask
+
+        k = min(k, len(self.latest))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[row], float(scores[row])) for row in top]
+
+
+def search_files(index_dir: Union[str, os.PathLike], query: str, embedder=None, k: int = 5) -> List[Tuple[str, float]]:
+    """Embed a text query and return the top-k (id, cosine similarity) pairs of the index.
+
+    Ids are file paths, or "<file path>#<column>" for column summaries of tabular files.
+    """
+    embedder = embedder or HashingEmbedder()
+    return VectorIndex(index_dir, embedder.dim).search(embedder.embed([query])[0], k=k)
@@ -0,0 +1,149 @@
+"""Worker processes claiming pipeline tasks from the job queue in the runs directory.
+
+    python src/worker.py --runs-dir runs --workers 4
+
+Workers on several hosts can share the same runs directory (e.g. a network mount).
+"""
+import os
+import time
+import socket
+import argparse
+import threading
+import constants
+import multiprocessing
+from job_queue import JobQueue
+from state import AgentState
+from metrics import instrument_node, get_metrics, drop_metrics
+
+
+def run_task(task: dict) -> None:
+    """Run the cleaning/indexing logic of the graph for a single task.
+
+    The graph logic records a failing file instead of raising, so the run manifest is checked
+    afterwards: a file that was not completed raises and the task is retried or failed.
+    The progress and metrics of the run are kept for this task only (workers are long-lived
+    and run the tasks of many runs), its metrics are exported to files of their own.
+    """
+    # Imported here so the parent process that only spawns workers stays light
+    from data_clean_agent import clean_files
+    from index_agent import index_files, finalize_index
+    from index_cache import hash_file
+    from run_manifest import RunManifest
+    from run_progress import reset_progress, drop_progress
+
+    def run(state: AgentState) -> None:
+        if task["attempts"] > 1:
+            get_metrics(state["uuid"]).record("retry", {"source": "task", "stage": task["stage"], "file": task["file_path"], "reason": f"attempt {task['attempts']}"})
+        if task["stage"] == "clean":
+            clean_files([task["file_path"]], state)
+        elif task["stage"] == "index":
+            index_files([task["file_path"]], state)
+        elif task["stage"] == "finalize":
+            finalize_index(state)
+            return
+        else:
+            raise ValueError(f"Unknown task stage {task['stage']}")
+
+        manifest = RunManifest(os.path.join(state["memory_path"], constants.RUN_MANIFEST_FILE_NAME))
+        if not manifest.is_done(task["stage"], task["file_path"], hash_file(task["file_path"])):
+            errors = [
+                event["error"] for event in progress.snapshot(task["stage"])
+                if event["name"] == task["file_path"] and event.get("error")
+            ]
+            raise RuntimeError(errors[-1] if errors else f"{task['stage']} of {task['file_path']} did not complete")
+
+    # Tasks are recorded like graph nodes, each task exports its own metrics files of the run
+    state = AgentState(**task["state"], messages=[])
+    progress = reset_progress(state["uuid"])  # Only events of this attempt
+    try:
+        instrument_node(task["stage"], run, export_suffix=f".task-{task['task_id']}")(state)
+    finally:
+        drop_progress(state["uuid"])
+        drop_metrics(state["uuid"])
+
+
+def work(
+        queue_path: str,
+        worker_id: str,
+        lease_seconds: float = constants.JOB_LEASE_SECONDS,
+        poll_seconds: float = constants.JOB_POLL_SECONDS,
+        exit_when_idle: bool = False
+    ) -> int:
+    """Claim and run tasks until stopped (or until the queue is empty with exit_when_idle).
+
+    The lease of the running task is extended from a heartbeat thread, if the worker
+    crashes the lease expires and another worker picks the task up.
+
+    Returns:
+        int: Number of tasks run
+    """
+    queue = JobQueue(queue_path)
+    n_tasks = 0
+    try:
+        while True:
+            task = queue.claim(worker_id, lease_seconds)
+            if task is None:
+                if exit_when_idle:
+                    return n_tasks
+                time.sleep(poll_seconds)
+                continue
+
+            print(f"[{worker_id}] {task['stage']} {task['file_path']} (run {task['run_id']}, attempt {task['attempts']})")
+            stop_heartbeat = threading.Event()
+
+            def heartbeat() -> None:
+                while not stop_heartbeat.wait(lease_seconds / 3):
+                    if not queue.heartbeat(task["task_id"], worker_id, lease_seconds):
+                        print(f"[{worker_id}] Lost the lease of task {task['task_id']}")
+                        return
+
+            heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+            heartbeat_thread.start()
+            try:
+                run_task(task)
+                queue.complete(task, worker_id)
+            except Exception as e:
+                print(f"[{worker_id}] Error in task {task['task_id']}: {str(e)}")
+                queue.fail(task, worker_id, str(e))
+            finally:
+                stop_heartbeat.set()
+                heartbeat_thread.join()
+            n_tasks += 1
+    finally:
+        queue.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run pipeline workers on the job queue of a runs directory")
+    parser.add_argument("--runs-dir", default="runs", help="Runs directory shared with the app")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--lease", type=float, default=constants.JOB_LEASE_SECONDS, help="Lease of a claimed task in seconds")
+    parser.add_argument("--poll", type=float, default=constants.JOB_POLL_SECONDS, help="Seconds between claims when the queue is empty")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Stop once there is nothing left to claim")
+    args = parser.parse_args()
+
+    os.makedirs(args.runs_dir, exist_ok=True)
+    queue_path = os.path.join(args.runs_dir, constants.JOB_QUEUE_FILE_NAME)
+    JobQueue(queue_path).close()  # Create the schema once before the workers start
+
+    processes = []
+    for i in range(max(1, args.workers)):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{i}"
+        process = multiprocessing.Process(
+            target=work,
+            args=(queue_path, worker_id, args.lease, args.poll, args.exit_when_idle),
+            name=worker_id
+        )
+        process.start()
+        processes.append(process)
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()